@@ -0,0 +1,198 @@
+"""
+Offline benchmark suite, no network access
+Times parsing/normalization, urlGen, full & incremental buildDatabase runs (from a
+pre-filled html cache), pdf bulletin parsing & backfill, batch watch evaluation and the Dash figure callback, with tracemalloc memory peaks.
+Usage:
+    python -m benchmarks.run [-o results.json] [--compare baseline.json] [--repeat N]
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+import plotly
+
+from tools import data, derived, pdf, storage, synthetic, variables, watches
+from tools.cache import htmlCache
+
+FIXTURES = pathlib.Path(__file__).parents[1].joinpath('tests', 'fixtures')
+FIXTURE_URL = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
+
+"""
+Function definitions
+"""
+
+def measure(func, repeat, setup=None):
+    """
+    Input:
+        func: callable to time, receives the value returned by setup
+        repeat: number of timed runs
+        setup: untimed callable run before every timed run
+    Output:
+        dict of timings in seconds & peak traced memory in bytes
+    """
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter()-start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        'runs': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'peak_bytes': peak,
+    }
+
+def fill_cache(cache_dir, html, start=variables.START_DATE, end=None):
+    """
+    store the recorded bulletin under every url urlGen builds between start & end
+    """
+    cache = htmlCache(cache_dir=cache_dir)
+    gen = data.urlGen(start_dt=start, end_dt=end or datetime.now())
+    for url in gen.url_list:
+        cache.store(url, html.encode('utf-8'), {})
+    cache.flush()
+    return len(gen.url_list)
+
+def store_at(path):
+    """
+    configured storage backend rooted at path
+    """
+    if isinstance(storage.get_store(), storage.parquetStore):
+        return storage.parquetStore(path)
+    return storage.csvStore(path.with_suffix('.csv'))
+
+def run(repeat):
+    """
+    Output:
+        {benchmark name: measure() result}
+    """
+    results = {}
+    html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()
+
+    #1. single bulletin parse & normalize
+    results['getUrlData.parse'] = measure(lambda _: data.getUrlData(FIXTURE_URL, html=html), repeat*10)
+    results['extract_employment_tables'] = measure(lambda _: data.extract_employment_tables(html), repeat*10)
+
+    #2. normalization over 120 concatenated bulletins
+    raw = data.parse_bulletin(FIXTURE_URL, html, normalize=False)
+    many = pd.concat([raw]*120)
+    results['normalize_frame.120_bulletins'] = measure(lambda _: data.normalize_frame(many), repeat)
+
+    #3. url generation
+    results['urlGen.url_list'] = measure(lambda _: data.urlGen(start_dt=datetime(2010, 1, 1)).url_list, repeat*10) #urls are generated lazily
+
+    #4. buildDatabase, full & incremental, html served from cache
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        n_urls = fill_cache(tmp.joinpath('cache'), html)
+        def build(all, store):
+            return data.buildDatabase(all=all, offline=True, cache=htmlCache(cache_dir=tmp.joinpath('cache')),
+                                        store=store, snapshot=None, cube=None, report_path=None,
+                                        derived=tmp.joinpath('derived.pkl'))
+
+        results['buildDatabase.full'] = measure(
+            lambda _: build(True, store_at(tmp.joinpath('full'))), repeat)
+        results['buildDatabase.full']['bulletins'] = n_urls
+
+        def one_behind(_):
+            #datalog missing only the latest bulletin
+            store = store_at(tmp.joinpath('incremental'))
+            build(True, store)
+            wide = storage.to_wide(store.read())
+            store.write(wide.loc[wide['date']<wide['date'].max()])
+            derived.derivedTable(tmp.joinpath('derived.pkl')).rebuild(store) #in sync, appends are derived incrementally
+            return store
+        results['buildDatabase.incremental'] = measure(lambda store: build(False, store), repeat, setup=lambda: one_behind(None))
+
+    #5. printed bulletins, one pdf & a year of them through the process pool
+    if pdf.pdfplumber is not None:
+        generator = synthetic.bulletinGenerator()
+        content = generator.generate_pdf(1, 2009)
+        results['getPdfData.parse'] = measure(lambda _: pdf.getPdfData('visabulletin_January2009.pdf', content=content), repeat*10)
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            for month in range(1, 13):
+                tmp.joinpath('visabulletin_{}2009.pdf'.format(variables.MONTH_DICT[month].capitalize())).write_bytes(generator.generate_pdf(month, 2009))
+            results['pdfBackfill.12_bulletins'] = measure(
+                lambda _: pdf.pdfBackfill([tmp], store=store_at(tmp.joinpath('datalog-{}'.format(time.perf_counter_ns()))),
+                                            derived=None, snapshot=None, cube=None), repeat)
+
+    #6. batch watch evaluation, 100k watches over the real datalog
+    index = watches.watchIndex(storage.load_dataset())
+    series = index.series.to_frame(index=False)[['country', 'EBn']].drop_duplicates()
+    watchlist = series.sample(100000, replace=True, random_state=0).reset_index(drop=True)
+    watchlist['priority_date'] = pd.Timestamp(2008, 1, 1) + pd.to_timedelta(range(100000), unit='h')
+    results['watchIndex.build'] = measure(lambda _: watches.watchIndex(storage.load_dataset()), repeat)
+    results['watchIndex.evaluate.100k'] = measure(lambda _: index.evaluate(watchlist), repeat)
+
+    #7. Dash figure callback, real datalog
+    import dash_plots
+    countries = sorted(dash_plots.dataset.get()[1].labels['country'])
+    def cold(_):
+        dash_plots.figure_cache.clear()
+        for country in countries:
+            dash_plots.update_figure(country)
+    results['update_figure.cold'] = measure(cold, repeat)
+    results['update_figure.cold']['calls'] = len(countries)
+    results['update_figure.cold']['payload_bytes'] = sum(
+        len(json.dumps(dash_plots.update_figure(c), cls=plotly.utils.PlotlyJSONEncoder)) for c in countries)
+    results['update_figure.cached'] = measure(lambda _: [dash_plots.update_figure(c) for c in countries], repeat*10)
+    results['update_figure.cached']['calls'] = len(countries)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=pathlib.Path(__file__).parents[1]).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline):
+    """
+    print median time & peak memory ratios against a previous results file
+    """
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        print("{:<32} time x{:.2f}  memory x{:.2f}".format(
+            name, result['median_s']/old['median_s'], result['peak_bytes']/max(old['peak_bytes'], 1)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion & the Dash app")
+    parser.add_argument('-o', '--output', help="write results json here, default stdout")
+    parser.add_argument('--compare', help="previous results json to compare against")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'results': run(args.repeat),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report['results'], json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Scale test of the full ingestion pipeline against the local stand-in server (tools.synthetic)
+Reports throughput, peak memory & failures under injected latency & errors
+Usage:
+    python -m benchmarks.scale [--start 1900-01] [--end 2021-12] [--latency 0.02] [--error-rate 0.01] [-o scale.json]
+"""
+import argparse
+import json
+import pathlib
+import resource
+import tempfile
+import time
+from datetime import datetime
+
+from tools import data
+from tools.cache import htmlCache
+from tools.synthetic import bulletinGenerator, standInServer
+from benchmarks.run import git_commit, store_at
+
+def main():
+    parser = argparse.ArgumentParser(description="Run buildDatabase over synthetic bulletins")
+    parser.add_argument('--start', default='1900-01', help="first bulletin, YYYY-MM")
+    parser.add_argument('--end', default='2021-12', help="last bulletin, YYYY-MM")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="fraction of requests answered with 503")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--parse-workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="write results json here, default stdout")
+    args = parser.parse_args()
+    start = datetime.strptime(args.start, '%Y-%m')
+    end = datetime.strptime(args.end, '%Y-%m')
+
+    server = standInServer(bulletinGenerator(seed=args.seed), latency=args.latency,
+                            error_rate=args.error_rate, last_bulletin=end, seed=args.seed)
+    with server, tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        store = store_at(tmp.joinpath('datalog'))
+        t0 = time.perf_counter()
+        incomplete = None
+        try:
+            build_report = data.buildDatabase(all=True, workers=args.workers, rate=None, parse_workers=args.parse_workers,
+                                cache=htmlCache(cache_dir=tmp.joinpath('cache')), store=store, snapshot=None, cube=None, derived=tmp.joinpath('derived.pkl'),
+                                base_url=server.base_url, start=start, end=end, report_path=None).report
+        except data.IncompleteBuild as e: #downloads failed through every retry, nothing committed
+            build_report, incomplete = e.report, str(e)
+        elapsed = time.perf_counter() - t0
+
+        requested = len(data.urlGen(start_dt=start, end_dt=end).url_list)
+        ingested = len(store.manifest.bulletins)
+        report = {
+            'commit': git_commit(),
+            'bulletins_requested': requested,
+            'bulletins_ingested': ingested,
+            'bulletins_failed': requested - ingested,
+            'rows': len(store.read().index) if store.exists() else 0,
+            'seconds': elapsed,
+            'bulletins_per_second': requested/elapsed,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, #kilobytes on linux
+            'server': dict(server.counts),
+            'incomplete': incomplete,
+            'stages': build_report.to_dict()['stages'],
+            'failures': build_report.to_dict()['failures'],
+            'config': vars(args),
+        }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -11,25 +11,24 @@ import pandas as pd
 import numpy as np
 import plots.variables as variables #change to plots.variables when calling from PROJECT_DIR
 import pathlib
-import sys
+import time
 from datetime import datetime
-epoch = datetime.utcfromtimestamp(0)
 
-#data import 
-if not variables.DATALOG.is_file():
-    print("Datalog missing")
-    sys.exit(0)
+#compact figure payloads
+from plots.figures import epoch_ms, compact_traces
+
+#data import, memory-mapped dataset cube shared by all workers when available (see cube.load_cube)
+#dataset is reloaded in the background when a new cube generation is published, cached figures are keyed by generation
+from plots.dataset import liveDataset, lruCache
+from tools.cube import load_cube, cube_version
+from tools.storage import empty_long
+figure_cache = lruCache(variables.FIGURE_CACHE_SIZE)
+dataset = liveDataset(loader=load_cube, version=cube_version, on_swap=[figure_cache.clear])
+dataset.start()
+if dataset.get()[1].rows==0:
+    print("No data yet") #app still starts, shows an empty figure
 else:
-    df = pd.read_csv(variables.DATALOG)
-    if len(df.index)==0:
-        print("Empty dataframe")
-        sys.exit(0)
-    else:
-        print("good to go")
-        countries = list(set(df.columns) - set(['EBn', 'state', 'date']))
-        for country in countries:
-            df[country] = pd.to_datetime(df[country])
-        df = pd.melt(df, id_vars=['EBn', 'state', 'date'], value_vars=countries, var_name='country', value_name='priority')
+    print("good to go")
 
 """
 TO DO
@@ -40,89 +39,127 @@ TO DO
 
 
 app = dash.Dash(
-    __name__
+    __name__,
+    compress=True #gzip/brotli via Flask-Compress, callbacks & /api responses
 )
 server = app.server
 
-app.layout = html.Div(
-    children=[
-        #header1
-        html.H1(
-            children="Visualize the employment-based priority dates released by USCIS",
-            className="header1"
-        ),
-
-        #header2
-        html.H2(
-            children="Data source: https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin.html",
-            className="header2"
-        ),
-
-        #Dropdown for country selection
-        html.Div(
-            children=[
-                #text for dropdown
-                html.Div(
-                    children=[
-                        dcc.Markdown("Select country:"),
-                    ]
-                ),
-                #dropdown
-                html.Div(
-                    children=[
-                        dcc.Dropdown(
-                            id='country-selection-dropdown',
-                            options=[
-                                {"label": s, "value":s} for s in df['country'].unique()
-                            ],
-                            value='CHINA', #default value of dropdown
-                            className="dropdown"
-                        )
-                    ]
-                ),
-            ]
-        ),
-
-        #DatePickerSingle to pick your priority date
-        html.Div(
-            children=[
-                #Text for date picker
-                html.Div(
-                    children = [
-                        dcc.Markdown("Select your priority date (appears as horizontal line in plot):"),
-                    ]
-                ),
-                #date picker
-                html.Div(
-                    children=[
-                        dcc.DatePickerSingle(
-                            id='date-picker-single',
-                            min_date_allowed=datetime(2016, 1, 1),
-                            max_date_allowed=datetime.now(),
-                            initial_visible_month=datetime(2017, 8, 5),
-                            date=datetime(2017, 8, 25),
-                            className='date-picker'
-                        )
-                    ]   
-                ),
-            ]
-
-        ),
-
-        #graph
-        dcc.Graph(id="all-data")
-    ],
-    className="container"
-)
+#request latency, payload size, cache & dataset metrics on /metrics
+from plots.metrics import serverMetrics
+metrics = serverMetrics()
+metrics.init_app(server)
+metrics.gauge('figure_cache_hits_total', lambda: figure_cache.hits, "figure cache hits", kind='counter')
+metrics.gauge('figure_cache_misses_total', lambda: figure_cache.misses, "figure cache misses", kind='counter')
+metrics.gauge('dataset_generation', lambda: dataset.generation, "generation of the dataset being served")
+metrics.gauge('dataset_rows', lambda: dataset.get()[1].rows, "rows in the dataset being served")
 
-@app.callback(
-    Output("all-data", "figure"),
-    Input("country-selection-dropdown", "value"),
-    Input("date-picker-single", "date")
-)
-def update_figure(selected_country, priority_date):
+#priority date projections, fitted once per dataset generation
+from plots.projection import projectionEngine
+projections = projectionEngine(dataset)
+
+#read-only JSON time series, e.g. /api/series?country=INDIA&ebn=2nd&state=final
+from plots.api import seriesApi
+api = seriesApi(dataset)
+api.init_app(server)
+
+def serve_layout():
+    """
+    layout is rebuilt on every page load so dropdown options follow dataset reloads
+    """
+    cube = dataset.get()[1]
+    return html.Div(
+        children=[
+            #header1
+            html.H1(
+                children="Visualize the employment-based priority dates released by USCIS",
+                className="header1"
+            ),
+
+            #header2
+            html.H2(
+                children="Data source: https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin.html",
+                className="header2"
+            ),
+
+            #Dropdown for country selection
+            html.Div(
+                children=[
+                    #text for dropdown
+                    html.Div(
+                        children=[
+                            dcc.Markdown("Select country:"),
+                        ]
+                    ),
+                    #dropdown
+                    html.Div(
+                        children=[
+                            dcc.Dropdown(
+                                id='country-selection-dropdown',
+                                options=[
+                                    {"label": s, "value":s} for s in sorted(cube.labels['country'])
+                                ],
+                                value='CHINA', #default value of dropdown
+                                className="dropdown"
+                            )
+                        ]
+                    ),
+                ]
+            ),
+
+            #DatePickerSingle to pick your priority date
+            html.Div(
+                children=[
+                    #Text for date picker
+                    html.Div(
+                        children = [
+                            dcc.Markdown("Select your priority date (appears as horizontal line in plot):"),
+                        ]
+                    ),
+                    #date picker
+                    html.Div(
+                        children=[
+                            dcc.DatePickerSingle(
+                                id='date-picker-single',
+                                min_date_allowed=datetime(2016, 1, 1),
+                                max_date_allowed=datetime.now(),
+                                initial_visible_month=datetime(2017, 8, 5),
+                                date=datetime(2017, 8, 25),
+                                className='date-picker'
+                            )
+                        ]   
+                    ),
+                ]
+
+            ),
+
+            #per-country figure without priority date line, line is drawn clientside
+            dcc.Store(id="country-figure"),
+
+            #graph
+            dcc.Graph(id="all-data"),
+
+            #when the selected priority date becomes current, per visa class & stage
+            html.Div(id="projection-table")
+        ],
+        className="container"
+    )
+
+app.layout = serve_layout
+
+def build_figure(df, selected_country):
+    """
+    faceted figure for one country, cached by update_figure since it only depends on the country
+    the priority date line is a placeholder, moved by the clientside callback below
+    compact: WebGL traces, dates sent as epoch ms on date axes, long traces downsampled (see plots.figures)
+    """
     filtered_dataset = df.loc[df['country']==selected_country]
-    priority_date = datetime.fromisoformat(priority_date)
+    if len(filtered_dataset.index)==0:
+        fig = px.scatter(title="No data yet", height=800)
+        return fig.to_plotly_json()
+    filtered_dataset = filtered_dataset.assign(
+        date=epoch_ms(filtered_dataset['date']),
+        priority=epoch_ms(filtered_dataset['priority'])
+    )
 
     #figure
     y = 'priority'
@@ -137,16 +174,89 @@ def update_figure(selected_country, priority_date):
         },
         height=800,
         facet_col='EBn', facet_col_wrap=4,
-        title="Priority dates by employment visa class"
+        title="Priority dates by employment visa class",
+        render_mode=variables.FIGURE_RENDER_MODE
     )
+    compact_traces(fig)
+    fig.update_xaxes(type='date')
+    fig.update_yaxes(type='date')
     #adding datetime as hline/vline: https://github.com/plotly/plotly.py/issues/3065#issuecomment-778652215
-    fig.add_hline(y=(priority_date - epoch).total_seconds() * 1000.0, 
+    fig.add_hline(y=0, #one line per facet, y set clientside
         # annotation_text="Priority Date",
         line_width=1, line_dash="dash", 
         line_color="green"
     )
+    return fig.to_plotly_json()
+
+@app.callback(
+    Output("country-figure", "data"),
+    Input("country-selection-dropdown", "value")
+)
+@metrics.timed('callback_seconds', "callback run time, excluding serialization")
+def update_figure(selected_country):
+    generation, cube = dataset.get() #same dataset for lookup & build
+    key = (generation, selected_country)
+    fig = figure_cache.get(key)
+    if fig is None:
+        start = time.perf_counter()
+        df = cube.to_long(country=selected_country) if selected_country in cube.codes['country'] else empty_long()
+        fig = build_figure(df, selected_country)
+        metrics.observe('figure_build_seconds', time.perf_counter()-start, help="pandas filtering & plotly express build")
+        figure_cache.put(key, fig)
     return fig
 
+def format_projection(row, lookback):
+    if row['unavailable']:
+        return "unavailable"
+    if row['current']:
+        return "current"
+    eta = row['eta_{}m'.format(lookback)]
+    return "not advancing" if pd.isna(eta) else eta.strftime('%b %Y')
+
+@app.callback(
+    Output("projection-table", "children"),
+    Input("country-selection-dropdown", "value"),
+    Input("date-picker-single", "date")
+)
+@metrics.timed('callback_seconds', "callback run time, excluding serialization")
+def update_projection(selected_country, priority_date):
+    if priority_date is None:
+        return html.Div("Pick a priority date")
+    result = projections.project(priority_date)
+    result = result.loc[result['country']==selected_country]
+    if len(result.index)==0:
+        return html.Div("No data yet")
+    lookbacks = variables.PROJECTION_LOOKBACKS
+    header = ["Visa class", "Visa Stage", "Latest cutoff"] + ["Current by ({} month trend)".format(l) for l in lookbacks]
+    rows = [
+        html.Tr([html.Td(row['EBn']), html.Td(row['state']), html.Td(row['cutoff'].strftime('%d %b %Y') if pd.notna(row['cutoff']) else "unavailable")]
+                + [html.Td(format_projection(row, l)) for l in lookbacks])
+        for _, row in result.iterrows()
+    ]
+    return html.Table(
+        [html.Thead(html.Tr([html.Th(h) for h in header])), html.Tbody(rows)],
+        className="projection-table"
+    )
+
+#moving the priority date line only touches the figure in the browser
+app.clientside_callback(
+    """
+    function(figure, priority_date) {
+        if (!figure) {
+            return window.dash_clientside.no_update;
+        }
+        const y = priority_date.slice(0, 10); //YYYY-MM-DD, date axes accept date strings
+        const shapes = (figure.layout.shapes || []).map(
+            shape => Object.assign({}, shape, {y0: y, y1: y})
+        );
+        return Object.assign({}, figure, {layout: Object.assign({}, figure.layout, {shapes: shapes})});
+    }
+    """,
+    Output("all-data", "figure"),
+    Input("country-figure", "data"),
+    Input("date-picker-single", "date")
+)
+
 
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -0,0 +1,110 @@
+#others
+import hashlib
+import itertools
+import json
+import threading
+
+from flask import Response, request
+
+from tools.cube import as_long
+
+"""
+Function definitions
+"""
+
+def to_json(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+"""
+Class definitions
+"""
+
+class seriesIndex():
+    """
+    Priority date time series of one dataset, keyed by (country, EBn, state)
+    Every series is serialized once when the index is built, queries only look up & join them
+    Inputs:
+        data: typed long dataframe
+    Attributes:
+        series: {(country, EBn, state): json object with columnar date & priority lists}
+        values: {'country'|'ebn'|'state': sorted distinct values}
+        version: digest of all series, same dataset->same version in every worker process
+    """
+    FIELDS = ('country', 'ebn', 'state')
+
+    def __init__(self, data):
+        self.series = {}
+        data = data.sort_values('date', kind='mergesort')
+        dates = data['date'].dt.strftime('%Y-%m-%d')
+        priorities = data['priority'].dt.strftime('%Y-%m-%d')
+        for (country, ebn, state), idx in data.groupby(['country', 'EBn', 'state'], observed=True, sort=True).indices.items():
+            self.series[(country, ebn, state)] = to_json({
+                'country': country, 'ebn': ebn, 'state': state,
+                'date': dates.iloc[idx].tolist(),
+                'priority': [p if isinstance(p, str) else None for p in priorities.iloc[idx]], #NaT->null
+            })
+        self.values = {field:sorted({key[i] for key in self.series}) for i, field in enumerate(self.FIELDS)}
+        digest = hashlib.sha256()
+        for key in sorted(self.series):
+            digest.update(self.series[key].encode('utf-8'))
+        self.version = digest.hexdigest()[:16]
+
+    def lookup(self, country=None, ebn=None, state=None):
+        """
+        Inputs:
+            lists of values to match per field, None->any value
+        Output:
+            list of serialized series, ordered by country, EBn, state
+        """
+        selected = [values or self.values[field] for field, values in zip(self.FIELDS, (country, ebn, state))]
+        return [self.series[key] for key in itertools.product(*selected) if key in self.series]
+
+class seriesApi():
+    """
+    Read-only JSON API for the Flask server behind the Dash app
+    /api/series?country=INDIA&ebn=2nd&state=final, each parameter optional & repeatable
+    Responses carry a weak ETag of the dataset version & answer If-None-Match with 304,
+    compression is applied by Flask-Compress (Dash(compress=True))
+    Inputs:
+        dataset: liveDataset of long dataframes or datasetCubes, the index is rebuilt once per dataset generation
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.lock = threading.Lock()
+        self.current = (None, None) #(generation, seriesIndex)
+
+    def get_index(self):
+        generation, data = self.dataset.get()
+        index = self.current
+        if index[0]!=generation:
+            with self.lock: #one build per generation
+                if self.current[0]!=generation:
+                    self.current = (generation, seriesIndex(as_long(data)))
+                index = self.current
+        return index[1]
+
+    def init_app(self, server):
+        """
+        register the /api routes on a Flask server
+        """
+        server.add_url_rule('/api/series', 'api_series', self.series_view)
+
+    def error(self, message, status=400):
+        return Response(to_json({'error': message}), status=status, mimetype='application/json')
+
+    def series_view(self):
+        unknown = set(request.args) - set(seriesIndex.FIELDS)
+        if unknown:
+            return self.error("unknown parameter(s): {}, expected {}".format(
+                                ', '.join(sorted(unknown)), ', '.join(seriesIndex.FIELDS)))
+
+        index = self.get_index()
+        if request.if_none_match.contains_weak(index.version):
+            response = Response(status=304)
+        else:
+            series = index.lookup(*[request.args.getlist(field) or None for field in seriesIndex.FIELDS])
+            body = '{{"version":"{}","series":[{}]}}'.format(index.version, ','.join(series))
+            response = Response(body, mimetype='application/json')
+        response.set_etag(index.version, weak=True) #weak, compression changes the bytes
+        response.headers['Cache-Control'] = 'no-cache' #clients revalidate, unchanged data costs a 304
+        return response
@@ -0,0 +1,117 @@
+#others
+import threading
+import time
+from collections import OrderedDict
+
+from tools import storage
+import plots.variables as variables
+
+"""
+Class definitions
+"""
+
+class lruCache():
+    """
+    Thread-safe mapping that evicts the least recently used key above maxsize
+    Counts hits & misses
+    Inputs:
+        maxsize: max number of entries
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Output:
+            cached value, None if key is missing
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class liveDataset():
+    """
+    Holds the app's dataset & swaps in a new one when its files change
+    (generation, dataframe) is replaced as a single tuple, so a reader calling get() once
+    never mixes two datasets. A swapped-out dataframe is never modified.
+    Inputs:
+        loader: returns the typed long dataframe
+        version: returns a token that changes with the underlying files
+        interval: seconds between background checks, 0 disables the background thread
+        on_swap: list of callables run after a new dataset is swapped in
+    """
+    def __init__(self, loader=storage.load_dataset, version=storage.dataset_version,
+                    interval=variables.RELOAD_INTERVAL, on_swap=None):
+        self.loader = loader
+        self.version = version
+        self.interval = interval
+        self.on_swap = on_swap if on_swap is not None else []
+        self.lock = threading.Lock() #one reload at a time
+        self.thread = None
+
+        self.token = self.version() #read before loading, a change during loading triggers another reload
+        self.current = (1, self.loader())
+
+    @property
+    def generation(self):
+        return self.current[0]
+
+    def get(self):
+        """
+        Output:
+            (generation, typed long dataframe)
+        """
+        return self.current
+
+    def check(self):
+        """
+        reload dataset if its files changed
+        Output:
+            True if a new dataset was swapped in
+        """
+        with self.lock:
+            token = self.version()
+            if token==self.token:
+                return False
+            try:
+                data = self.loader()
+            except Exception as e: #keep serving the current dataset
+                print(f"Exception reloading dataset {e}")
+                return False
+            self.token = token
+            self.current = (self.current[0]+1, data)
+        for func in self.on_swap:
+            func()
+        return True
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
+
+    def start(self):
+        """
+        start background reload thread, daemon so it never blocks shutdown
+        """
+        if self.interval and self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='dataset-reload', daemon=True)
+            self.thread.start()
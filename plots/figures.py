@@ -0,0 +1,58 @@
+#others
+import numpy as np
+import pandas as pd
+
+import plots.variables as variables
+
+"""
+Function definitions
+"""
+
+def epoch_ms(dates):
+    """
+    Input:
+        datetime-like series or array
+    Output:
+        float64 milliseconds since epoch, NaN for NaT
+        date axes read numbers as epoch ms, ~13 characters per point instead of an ISO string
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ms]')
+    ms = dates.astype('int64').astype('float64')
+    ms[np.isnat(dates)] = np.nan
+    return ms
+
+def minmax_indices(y, max_points):
+    """
+    Input:
+        y: float array without NaN, in plotting order
+        max_points: points to keep at most, 0->keep all
+    Output:
+        sorted indices of the points to keep, the lowest & highest point of every bucket of
+        consecutive points, so steps & retrogressions stay visible
+    """
+    n = len(y)
+    if not max_points or n<=max_points:
+        return np.arange(n)
+    buckets = max(max_points//2, 1)
+    bucket = np.arange(n)*buckets//n
+    order = np.lexsort((y, bucket)) #by bucket, then y
+    starts = np.searchsorted(bucket[order], np.arange(buckets), side='left')
+    ends = np.searchsorted(bucket[order], np.arange(buckets), side='right') - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+def compact_traces(fig, max_points=variables.FIGURE_MAX_POINTS):
+    """
+    Shrink the payload of a figure whose x & y hold epoch ms, in place
+    1. drop points without a cutoff (U), they aren't drawn
+    2. min/max-preserving downsampling of long traces
+    3. integer ms, no trailing .0 in the json
+    """
+    for trace in fig.data:
+        x = np.asarray(trace.x, dtype='float64')
+        y = np.asarray(trace.y, dtype='float64')
+        keep = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[keep], y[keep]
+        idx = minmax_indices(y, max_points)
+        trace.x = x[idx].astype('int64')
+        trace.y = y[idx].astype('int64')
+    return fig
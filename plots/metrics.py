@@ -0,0 +1,178 @@
+#others
+import bisect
+import functools
+import threading
+import time
+
+from flask import Response, g, request
+
+import plots.variables as variables
+
+"""
+Function definitions
+"""
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in labels.items()}
+    return '{' + ','.join('{}="{}"'.format(k, escaped[k]) for k in sorted(escaped)) + '}'
+
+"""
+Class definitions
+"""
+
+class histogram():
+    """
+    Thread-safe cumulative histogram in the Prometheus sense
+    Inputs:
+        buckets: sorted upper bounds, +Inf is implied
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counts = [0]*(len(self.buckets)+1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labels):
+        """
+        Output:
+            list of exposition lines for this histogram
+        """
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = '+Inf' if bound==float('inf') else repr(bound)
+            lines.append('{}_bucket{} {}'.format(name, format_labels(dict(labels, le=le)), cumulative))
+        lines.append('{}_sum{} {}'.format(name, format_labels(labels), total))
+        lines.append('{}_count{} {}'.format(name, format_labels(labels), count))
+        return lines
+
+class serverMetrics():
+    """
+    Request metrics for the Flask server behind the Dash app, exposed at /metrics
+    1. latency & response size histograms per path (Dash callbacks labelled by output id),
+        sizes are taken as sent, after Flask-Compress, see measure_size
+    2. callback & figure build time histograms, see timed
+    3. gauges computed at scrape time, e.g. cache hit counts & dataset generation
+    Inputs:
+        prefix: metric name prefix
+    """
+    def __init__(self, prefix='visa_bulletin'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {} #{(name, labels): histogram}
+        self.help = {}
+        self.gauges = [] #[(name, kind, help, func)], func returns a number
+
+    def get_histogram(self, name, labels, buckets, help):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = histogram(buckets)
+                self.help[name] = help
+            return self.histograms[key]
+
+    def observe(self, name, value, labels=None, buckets=variables.LATENCY_BUCKETS, help=''):
+        self.get_histogram(self.prefix + '_' + name, labels or {}, buckets, help).observe(value)
+
+    def gauge(self, name, func, help='', kind='gauge'):
+        """
+        register a value read at scrape time, kind='counter' for monotonic values
+        """
+        self.gauges.append((self.prefix + '_' + name, kind, help, func))
+
+    def timed(self, name, help=''):
+        """
+        decorator recording the wrapped function's run time as histogram name{callback=<function name>}
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter()-start, {'callback': func.__name__}, help=help)
+            return wrapper
+        return decorator
+
+    def init_app(self, server):
+        """
+        register request hooks & the /metrics route on a Flask server
+        """
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
+        server.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        server.wsgi_app = self.measure_size(server.wsgi_app)
+
+    def measure_size(self, wsgi_app):
+        """
+        wrap a WSGI app to record response_bytes from the Content-Length the client receives
+        after_request hooks run in reverse order of registration, so the compression hook Dash registers first
+        only runs after this class's hook, the size is known once the response starts
+        """
+        @functools.wraps(wsgi_app)
+        def app(environ, start_response):
+            def sized_start_response(status, headers, exc_info=None):
+                labels = environ.get('metrics.labels')
+                length = [value for name, value in headers if name.lower()=='content-length']
+                if labels is not None and length: #streamed responses have no known size
+                    self.observe('response_bytes', int(length[0]), labels, buckets=variables.SIZE_BUCKETS,
+                                    help="response size as sent, after compression")
+                return start_response(status, headers, exc_info)
+            return wsgi_app(environ, sized_start_response)
+        return app
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        labels = {'path': request.url_rule.rule if request.url_rule else 'unmatched'}
+        if request.path.endswith('_dash-update-component'):
+            body = request.get_json(silent=True) or {}
+            labels['callback'] = str(body.get('output', 'unknown'))
+        self.observe('request_seconds', time.perf_counter()-start, labels,
+                        help="request latency, including figure serialization")
+        request.environ['metrics.labels'] = labels #response size is recorded by measure_size
+        return response
+
+    def render(self):
+        """
+        Output:
+            all metrics in Prometheus text exposition format
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        seen = set()
+        for (name, labels), hist in histograms:
+            if name not in seen:
+                seen.add(name)
+                if self.help.get(name):
+                    lines.append('# HELP {} {}'.format(name, self.help[name]))
+                lines.append('# TYPE {} histogram'.format(name))
+            lines.extend(hist.render(name, dict(labels)))
+        for name, kind, help, func in self.gauges:
+            if help:
+                lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            lines.append('{} {}'.format(name, func()))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,159 @@
+#others
+import threading
+
+import numpy as np
+import pandas as pd
+
+from plots.dataset import lruCache
+from tools.cube import as_cube, MISSING, UNAVAILABLE
+import plots.variables as variables
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+DAY = np.timedelta64(1, 'D')
+MONTH_DAYS = 365.2425/12
+
+"""
+Function definitions
+"""
+
+def to_dates(days):
+    """
+    Input:
+        float array of whole days since epoch, NaN for unknown
+    Output:
+        datetime64[ns] array, NaT for unknown
+    """
+    dates = np.full(len(days), np.datetime64('NaT'), dtype='datetime64[ns]')
+    known = ~np.isnan(days)
+    dates[known] = EPOCH + days[known].astype('int64')*DAY
+    return dates
+
+"""
+Class definitions
+"""
+
+class projectionModel():
+    """
+    Linear fits of cutoff date against bulletin date for every (country, EBn, state) series at once
+    Series are read from the dataset cube as a [series, bulletin] matrix of days since epoch, each lookback window
+    is fitted with masked least squares sums, so a new priority date only needs a few array operations
+    Inputs:
+        data: typed long dataframe or datasetCube
+        lookbacks: months of bulletins the advancement rate is fitted over, one projection per window
+        horizon: years after the latest bulletin beyond which a projection is reported as NaT
+    Attributes:
+        keys: dataframe of country, EBn, state, as_of (latest bulletin listing the series), its cutoff
+            & unavailable (cutoff is U in that bulletin)
+        rates: {lookback: cutoff days advanced per calendar day, NaN if it can't be fitted}
+    """
+    def __init__(self, data, lookbacks=variables.PROJECTION_LOOKBACKS, horizon=variables.PROJECTION_HORIZON):
+        self.lookbacks = tuple(lookbacks)
+        self.horizon = horizon*365.2425
+        cube = as_cube(data)
+        x = (cube.labels['date'] - EPOCH) / DAY #bulletin dates
+        n_series = int(np.prod(cube.values.shape[1:]))
+        days = np.moveaxis(cube.values, 0, -1).reshape(n_series, len(x)) #[series, bulletin], series in EBn, state, country order
+        listed = days!=MISSING
+        series = listed.any(axis=1)
+        days, listed = days[series], listed[series]
+        y = np.where(days<=UNAVAILABLE, np.nan, days) #cutoffs, NaN for U & unlisted
+        valid = ~np.isnan(y)
+
+        #latest bulletin listing each series anchors its projection, U there->unavailable
+        self.keys = pd.MultiIndex.from_product([cube.labels[axis] for axis in ('EBn', 'state', 'country')],
+                                                names=['EBn', 'state', 'country']).to_frame(index=False).loc[series]
+        self.keys = self.keys[['country', 'EBn', 'state']].reset_index(drop=True)
+        if y.size:
+            last = y.shape[1] - 1 - np.argmax(listed[:, ::-1], axis=1)
+            rows = np.arange(len(y))
+            self.as_of = x[last]
+            self.cutoff = y[rows, last]
+        else:
+            self.as_of = self.cutoff = np.full(len(y), np.nan)
+        self.keys['as_of'] = to_dates(self.as_of)
+        self.keys['cutoff'] = to_dates(self.cutoff)
+        self.keys['unavailable'] = np.isnan(self.cutoff)
+
+        self.rates = {}
+        latest = x.max() if x.size else 0.0
+        for lookback in self.lookbacks:
+            mask = valid & (x>latest - lookback*MONTH_DAYS)
+            self.rates[lookback] = self.fit(np.broadcast_to(x - latest, y.shape), y - latest, mask) #centered, same slope
+
+    @staticmethod
+    def fit(x, y, mask):
+        """
+        Output:
+            least squares slope of y on x per row over masked points, NaN with fewer than 2 bulletins
+        """
+        n = mask.sum(axis=1)
+        x = np.where(mask, x, 0.0)
+        y = np.where(mask, y, 0.0)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        sxx, sxy = (x*x).sum(axis=1), (x*y).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = n*sxx - sx*sx
+            slope = (n*sxy - sx*sy) / denominator
+        return np.where((n>=2) & (denominator>0), slope, np.nan)
+
+    def project(self, priority_date):
+        """
+        Input:
+            priority_date: date-like
+        Output:
+            keys with columns
+            current: priority_date is not after the latest cutoff, never for unavailable series
+            rate_<lookback>m: cutoff days advanced per month
+            eta_<lookback>m: estimated bulletin date priority_date becomes current,
+                NaT if the series is unavailable, the cutoff isn't advancing or the estimate is beyond the horizon
+        """
+        p = (np.datetime64(pd.Timestamp(priority_date).date(), 'D') - EPOCH) / DAY
+        result = self.keys.copy()
+        current = p<=self.cutoff
+        result['current'] = current
+        for lookback, rate in self.rates.items():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                eta = self.as_of + np.ceil((p - self.cutoff)/rate) #whole days
+            eta = np.where(current, self.as_of, np.where((rate>0) & (eta-self.as_of<=self.horizon), eta, np.nan))
+            result['rate_{}m'.format(lookback)] = rate*MONTH_DAYS
+            result['eta_{}m'.format(lookback)] = to_dates(eta)
+        return result
+
+class projectionEngine():
+    """
+    Projections for the dataset being served, the model is fitted once per dataset generation
+    & answers are cached per (generation, priority date)
+    Inputs:
+        dataset: liveDataset
+        lookbacks: see projectionModel
+        maxsize: cached answers
+    """
+    def __init__(self, dataset, lookbacks=variables.PROJECTION_LOOKBACKS, maxsize=variables.FIGURE_CACHE_SIZE):
+        self.dataset = dataset
+        self.lookbacks = lookbacks
+        self.lock = threading.Lock()
+        self.current = (None, None) #(generation, projectionModel)
+        self.cache = lruCache(maxsize)
+
+    def get_model(self):
+        generation, data = self.dataset.get()
+        model = self.current
+        if model[0]!=generation:
+            with self.lock: #one fit per generation
+                if self.current[0]!=generation:
+                    self.current = (generation, projectionModel(data, self.lookbacks))
+                model = self.current
+        return model
+
+    def project(self, priority_date):
+        """
+        Output:
+            see projectionModel.project, don't modify the returned dataframe
+        """
+        generation, model = self.get_model()
+        key = (generation, str(pd.Timestamp(priority_date).date()))
+        result = self.cache.get(key)
+        if result is None:
+            result = model.project(priority_date)
+            self.cache.put(key, result)
+        return result
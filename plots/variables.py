@@ -10,4 +10,22 @@ DATALOG = PROJECT_DIR.joinpath('data', 'datalog.csv')
 
 #default start date
 from datetime import datetime
-START_DATE = datetime(year=2016, month=1, day=1)
\ No newline at end of file
+START_DATE = datetime(year=2016, month=1, day=1)
+
+#figure cache
+FIGURE_CACHE_SIZE = 16 #countries kept in the per-country figure cache
+
+#figure payload
+FIGURE_RENDER_MODE = 'webgl' #'webgl' (scattergl) or 'svg'
+FIGURE_MAX_POINTS = 500 #points per trace before min/max downsampling, 0 disables
+
+#hot reload
+RELOAD_INTERVAL = 60 #seconds between checks for a new dataset, 0 disables reloading
+
+#priority date projections
+PROJECTION_LOOKBACKS = (6, 12, 24) #months of bulletins the cutoff advancement rate is fitted over
+PROJECTION_HORIZON = 50 #years, later estimates are shown as not current
+
+#metrics endpoint
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) #seconds
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6) #bytes
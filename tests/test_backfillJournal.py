@@ -0,0 +1,54 @@
+from tools import checkpoint, data, storage, synthetic
+from tools.cache import htmlCache
+from datetime import datetime
+import pathlib
+import tempfile
+import unittest
+
+class TestBackfillJournal(unittest.TestCase):
+    """
+    Test case for checkpoint.backfillJournal class & resumable data.buildDatabase runs
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name)
+        self.server = synthetic.standInServer(last_bulletin=datetime(2021, 12, 1))
+        self.server.start()
+
+    def build(self, store):
+        return data.buildDatabase(all=True, workers=4, rate=None, resume=True, snapshot=None, cube=None, report_path=None,
+                                    cache=htmlCache(cache_dir=self.path.joinpath('cache')), store=store,
+                                    checkpoint_dir=self.path.joinpath('checkpoint'), derived=self.path.joinpath('derived.pkl'),
+                                    base_url=self.server.base_url, start=datetime(2021, 1, 1), end=datetime(2021, 12, 1))
+
+    def test_resume(self):
+        """
+        a crash before the datalog is committed keeps finished bulletins, the next run doesn't fetch them again
+        """
+        class crashingSink(storage.csvSink):
+            def commit(self):
+                raise RuntimeError("crash")
+
+        class crashingStore(storage.csvStore):
+            def writer(self, replace=False):
+                return crashingSink(self, replace)
+
+        with self.assertRaises(RuntimeError):
+            self.build(crashingStore(self.path.joinpath('datalog.csv')))
+        self.assertEqual(len(checkpoint.backfillJournal(self.path.joinpath('checkpoint'))), 12)
+        requests = self.server.counts['requests']
+
+        store = storage.csvStore(self.path.joinpath('datalog.csv'))
+        obj = self.build(store)
+        self.assertEqual(self.server.counts['requests'], requests) #every bulletin resumed
+        self.assertEqual(obj.report.counters['bulletins_resumed'], 12)
+        self.assertEqual(len(store.manifest.bulletins), 12)
+        self.assertFalse(self.path.joinpath('checkpoint').exists()) #cleared after write
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
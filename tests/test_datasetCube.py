@@ -0,0 +1,111 @@
+from tools import cube, data, storage
+from tools.cache import htmlCache
+import numpy as np
+import pandas as pd
+import pathlib
+import tempfile
+import unittest
+from datetime import datetime
+
+FIXTURES = pathlib.Path(__file__).parent.joinpath('fixtures')
+
+class TestDatasetCube(unittest.TestCase):
+    """
+    Test case for cube.datasetCube class
+    """
+    def setUp(self):
+        url = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
+        january = data.getUrlData(url, html=FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()).data
+        february = january.drop(columns=['MEXICO']) #country not listed in this bulletin
+        february['date'] = pd.Timestamp(2021, 2, 1)
+        self.data = storage.to_long(pd.concat([january, february]))
+        self.cube = cube.datasetCube.from_long(self.data)
+
+    def sort(self, data):
+        data = data.astype({'EBn': str, 'state': str, 'country': str})
+        return data.sort_values(['date', 'EBn', 'state', 'country']).reset_index(drop=True)
+
+    def test_roundtrip(self):
+        """
+        listed cells, U cells included, come back as the same long dataframe
+        """
+        self.assertEqual(self.cube.values.dtype, np.int32)
+        self.assertEqual(self.cube.values.shape, (2, 8, 2, 7))
+        result = self.cube.to_long()
+        self.assertEqual(str(result['country'].dtype), 'category')
+        pd.testing.assert_frame_equal(self.sort(result), self.sort(self.data)[result.columns])
+        self.assertTrue(result['priority'].isna().any()) #U cells
+        self.assertFalse(((result['country']=='MEXICO') & (result['date']==pd.Timestamp(2021, 2, 1))).any())
+
+    def test_select(self):
+        values, labels = self.cube.select(country='INDIA', state='final')
+        self.assertTrue(np.shares_memory(values, self.cube.values)) #view
+        self.assertEqual(values.shape, (2, 8, 1, 1))
+        series = self.cube.series('INDIA', '2nd', 'final')
+        expected = storage.filter_long(self.data, countries=['INDIA'], states=['final'], ebns=['2nd'])
+        self.assertEqual(list(cube.to_dates(series)), list(expected.sort_values('date')['priority']))
+
+        result = self.cube.to_long(country=['INDIA', 'CHINA'], date='2021-02-01')
+        expected = storage.filter_long(self.data, countries=['INDIA', 'CHINA'], start='2021-02-01')
+        pd.testing.assert_frame_equal(self.sort(result), self.sort(expected)[result.columns])
+        with self.assertRaises(KeyError):
+            self.cube.series('NOWHERE', '2nd', 'final')
+
+    def test_mmap(self):
+        """
+        published generations are memory-mapped read-only, older ones are pruned
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(cube.read_cube(tmp))
+            for generation in [1, 2, 3]:
+                cube.write_cube(self.data, generation, tmp)
+            self.assertEqual(sorted(p.name for p in pathlib.Path(tmp).glob('*.npy')), ['cube-2.npy', 'cube-3.npy'])
+
+            result, generation = cube.read_cube(tmp)
+            self.assertEqual(generation, 3)
+            self.assertIsInstance(result.values, np.memmap)
+            self.assertFalse(result.values.flags.writeable)
+            np.testing.assert_array_equal(result.values, self.cube.values)
+            pd.testing.assert_frame_equal(result.to_long(country='INDIA'), self.cube.to_long(country='INDIA'))
+
+            token = cube.cube_version(tmp)
+            cube.write_cube(self.data.loc[self.data['country']!='INDIA'], 4, tmp)
+            self.assertNotEqual(cube.cube_version(tmp), token)
+            self.assertNotIn('INDIA', cube.load_cube(tmp).codes['country'])
+
+    def test_unchanged(self):
+        """
+        a poll without new bulletins doesn't republish the cube, workers keep their caches
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            store = storage.csvStore(tmp.joinpath('datalog.csv'))
+            store.write(storage.to_wide(self.data))
+            data.publish(store, snapshot=tmp.joinpath('snapshot.pkl'), cube=tmp.joinpath('cube'))
+            token = cube.cube_version(tmp.joinpath('cube'))
+            snapshot = tmp.joinpath('snapshot.pkl').stat().st_mtime_ns
+
+            data.buildDatabase(all=False, offline=True, cache=htmlCache(cache_dir=tmp.joinpath('cache')), store=store, snapshot=tmp.joinpath('snapshot.pkl'),
+                                cube=tmp.joinpath('cube'), derived=None, report_path=None, end=datetime(2021, 2, 1))
+            self.assertEqual(cube.cube_version(tmp.joinpath('cube')), token)
+            self.assertEqual(tmp.joinpath('snapshot.pkl').stat().st_mtime_ns, snapshot)
+
+    def test_new_store(self):
+        """
+        a fresh store restarts its generations but is still published over the cube of the previous one
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            for name, data_ in [('a', self.data.loc[self.data['date']==pd.Timestamp(2021, 1, 1)]), ('b', self.data)]:
+                store = storage.csvStore(tmp.joinpath(name, 'datalog.csv'))
+                store.write(storage.to_wide(data_))
+                data.publish(store, snapshot=None, cube=tmp.joinpath('cube'), changed=False)
+            result, generation = cube.read_cube(tmp.joinpath('cube'))
+            self.assertEqual(generation, storage.csvStore(tmp.joinpath('a', 'datalog.csv')).manifest.generation) #same generation
+            self.assertEqual(len(result.labels['date']), 2)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
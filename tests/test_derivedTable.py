@@ -0,0 +1,58 @@
+from tools import data, derived, storage, synthetic
+import pandas as pd
+import pathlib
+import tempfile
+import unittest
+
+class TestDerivedTable(unittest.TestCase):
+    """
+    Test case for derived.derivedTable class & derived.derive
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name)
+        generator = synthetic.bulletinGenerator(seed=1)
+        url_list = data.urlGen(pd.Timestamp(2020, 11, 1), pd.Timestamp(2021, 3, 1)).url_list
+        self.bulletins = [data.getUrlData(url, html=generator.generate(dt.month, dt.year)).data
+                            for url, dt in zip(url_list, pd.date_range('2020-11-01', periods=5, freq='MS'))]
+
+    def test_derive(self):
+        long = storage.to_long(pd.concat(self.bulletins))
+        result = derived.derive(long)
+        self.assertEqual(len(result), len(long))
+        series = result.loc[(result['country']=='INDIA') & (result['EBn']=='2nd') & (result['state']=='final')]
+        self.assertTrue(series['date'].is_monotonic_increasing)
+        expected = series['priority'].diff().dt.days
+        pd.testing.assert_series_equal(series['movement_days'], expected.astype(float), check_names=False)
+        self.assertTrue((series['retrogressed']==(expected<0)).all())
+        self.assertTrue((result.loc[result['current'], 'gap_days']==0).all())
+
+    def test_incremental(self):
+        """
+        appended bulletins give the same table as a full rebuild, out of order appends rebuild
+        """
+        store = storage.csvStore(self.path.joinpath('datalog.csv'))
+        table = derived.derivedTable(self.path.joinpath('derived.pkl'))
+        store.write(pd.concat(self.bulletins[:3]))
+        table.rebuild(store)
+        for bulletin in self.bulletins[3:]:
+            store.append(bulletin)
+            table.update(storage.to_long(bulletin), store)
+
+        expected = derived.derive(store.read())
+        result = derived.derivedTable(self.path.joinpath('derived.pkl')) #reloaded from disk
+        self.assertEqual(result.bulletins, store.manifest.bulletins)
+        pd.testing.assert_frame_equal(result.data, expected)
+
+        store.write(pd.concat(self.bulletins[1:])) #first bulletin arrives late
+        result.rebuild(store)
+        store.append(self.bulletins[0])
+        result.update(storage.to_long(self.bulletins[0]), store)
+        pd.testing.assert_frame_equal(result.read(), expected)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,71 @@
+from tools import synthetic
+from tools.session import fetchSession, BulletinMissing, FetchError, TransientFetchError
+from datetime import datetime
+import requests
+import unittest
+
+class TestFetchSession(unittest.TestCase):
+    """
+    Test case for session.fetchSession class
+    """
+    def setUp(self):
+        self.server = synthetic.standInServer(last_bulletin=datetime(2021, 6, 1), error_rate=0.5)
+        self.server.start()
+        self.url = f"{self.server.base_url}/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html"
+
+    def test_retry(self):
+        """
+        transient 503s are retried until the page comes through
+        """
+        session = fetchSession(retries=20, backoff=0.001, max_backoff=0.01)
+        for i in range(10):
+            self.assertEqual(session.get(self.url).status_code, 200)
+        self.assertGreater(session.retried, 0)
+
+    def test_exhausted(self):
+        """
+        retries are bounded
+        """
+        self.server.error_rate = 1.0
+        session = fetchSession(retries=2, backoff=0.001, max_backoff=0.01)
+        with self.assertRaises(TransientFetchError):
+            session.get(self.url)
+        self.assertEqual(session.retried, 2)
+
+    def test_missing(self):
+        """
+        unpublished bulletins raise BulletinMissing without retries
+        """
+        self.server.error_rate = 0.0
+        session = fetchSession(retries=4, backoff=0.001)
+        with self.assertRaises(BulletinMissing):
+            session.get(self.url.replace('january-2021', 'july-2021')) #after last_bulletin
+        self.assertEqual(session.retried, 0)
+
+    def test_broken_body(self):
+        """
+        a truncated response body is retried like a dropped connection, a malformed url fails without retries
+        """
+        self.server.error_rate = 0.0
+        session = fetchSession(retries=2, backoff=0.001, max_backoff=0.01)
+        request = session.session.request
+        calls = []
+        def truncated(*args, **kwargs):
+            calls.append(args)
+            if len(calls)==1:
+                raise requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead")
+            return request(*args, **kwargs)
+        session.session.request = truncated
+        self.assertEqual(session.get(self.url).status_code, 200)
+        self.assertEqual(session.retried, 1)
+
+        with self.assertRaises(FetchError):
+            session.get('visa-bulletin-for-january-2021.html') #no scheme
+        self.assertEqual(session.retried, 1)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
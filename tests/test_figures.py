@@ -0,0 +1,40 @@
+from plots import figures
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import unittest
+
+class TestFigures(unittest.TestCase):
+    """
+    Test case for compact figure helpers in plots.figures
+    """
+    def test_epoch_ms(self):
+        ms = figures.epoch_ms([pd.Timestamp(2021, 1, 1), pd.NaT])
+        self.assertEqual(ms[0], pd.Timestamp(2021, 1, 1).value//10**6)
+        self.assertTrue(np.isnan(ms[1]))
+
+    def test_downsample(self):
+        """
+        long traces keep at most max_points, including every bucket's extremes
+        """
+        y = np.sin(np.arange(5000)/50.0)
+        y[1234] = -5 #retrogression spike
+        idx = figures.minmax_indices(y, 200)
+        self.assertLessEqual(len(idx), 200)
+        self.assertTrue((np.diff(idx)>0).all())
+        self.assertIn(1234, idx)
+        self.assertEqual(y[idx].max(), y.max())
+        self.assertEqual(len(figures.minmax_indices(y[:100], 200)), 100)
+
+    def test_compact_traces(self):
+        x = figures.epoch_ms(pd.date_range('2016-01-01', periods=4, freq='MS'))
+        y = figures.epoch_ms([pd.Timestamp(2010, 1, 1), pd.NaT, pd.Timestamp(2010, 2, 1), pd.Timestamp(2010, 3, 1)])
+        fig = figures.compact_traces(go.Figure(go.Scattergl(x=x, y=y)), max_points=0)
+        self.assertEqual(list(fig.data[0].x), [int(v) for v in x[[0, 2, 3]]]) #U cell dropped
+        self.assertEqual(fig.data[0].y.dtype, np.int64)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
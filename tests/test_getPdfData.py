@@ -0,0 +1,85 @@
+from tools import data, pdf, storage, synthetic
+from tools.cache import htmlCache
+from datetime import datetime
+import pandas as pd
+import pathlib
+import tempfile
+import unittest
+
+@unittest.skipIf(pdf.pdfplumber is None, "pdfplumber not installed")
+class TestPdfData(unittest.TestCase):
+    """
+    Test case for pdf.getPdfData & pdf.pdfBackfill classes
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name)
+        self.generator = synthetic.bulletinGenerator()
+
+    def test_data(self):
+        """
+        a printed bulletin gives the rows of the same bulletin's html page, also when a table is split by a page break
+        """
+        url = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2009/visa-bulletin-for-january-2009.html'
+        html = data.getUrlData(url, html=self.generator.generate(1, 2009)).data
+        html = html[html['state']=='final'].reset_index(drop=True) #only final action dates before October 2015
+
+        for height in [792, 260]:
+            obj = pdf.getPdfData('visabulletin_January2009.pdf', content=self.generator.generate_pdf(1, 2009, height=height))
+            self.assertIsNone(obj.error)
+            pd.testing.assert_frame_equal(obj.data.reset_index(drop=True), html)
+
+        obj = pdf.getPdfData('visa-bulletin-for-march-2021.pdf', content=self.generator.generate_pdf(3, 2021))
+        self.assertEqual(sorted(obj.data['state'].unique()), ['filing', 'final'])
+
+    def test_backfill(self):
+        """
+        pdf directory is parsed in the process pool into the store, a second run skips ingested bulletins
+        """
+        for month in range(1, 7):
+            name = 'visabulletin_{}2008.pdf'.format(data.variables.MONTH_DICT[month].capitalize())
+            self.path.joinpath(name).write_bytes(self.generator.generate_pdf(month, 2008))
+        self.path.joinpath('notice.pdf').write_bytes(b'not a bulletin')
+        store = storage.csvStore(self.path.joinpath('datalog.csv'))
+
+        obj = pdf.pdfBackfill([self.path], workers=2, store=store, derived=self.path.joinpath('derived.pkl'),
+                                snapshot=None, cube=None, batch=4)
+        self.assertEqual(obj.report.counters['bulletins_parsed'], 6)
+        self.assertEqual(obj.report.counters['bulletins_failed'], 1) #notice.pdf
+        self.assertEqual(len(store.manifest.bulletins), 6)
+        self.assertEqual(len(store.read()), 6*8*5) #EBn rows x countries
+
+        obj = pdf.pdfBackfill([self.path], workers=2, store=store, derived=None, snapshot=None, cube=None)
+        self.assertEqual(obj.report.counters['bulletins_skipped'], 6)
+        self.assertNotIn('bulletins_parsed', obj.report.counters)
+
+    def test_rebuild_keeps_backfill(self):
+        """
+        a full html rebuild carries pdf bulletins from before its start over into the new datalog
+        """
+        for month in [1, 2]:
+            self.path.joinpath('visabulletin_{}2008.pdf'.format(data.variables.MONTH_DICT[month].capitalize())).write_bytes(
+                self.generator.generate_pdf(month, 2008))
+        stores = [storage.csvStore(self.path.joinpath('datalog.csv'))]
+        if storage.pa is not None:
+            stores.append(storage.parquetStore(self.path.joinpath('datalog')))
+
+        with synthetic.standInServer(last_bulletin=datetime(2021, 2, 1)) as server:
+            for store in stores:
+                pdf.pdfBackfill([self.path], workers=2, store=store, derived=None, snapshot=None, cube=None)
+                backfill = store.read()
+                obj = data.buildDatabase(all=True, workers=2, rate=None, store=store, snapshot=None, cube=None, derived=None,
+                                            report_path=None, cache=htmlCache(cache_dir=self.path.joinpath('cache')),
+                                            base_url=server.base_url, start=datetime(2021, 1, 1), end=datetime(2021, 2, 1))
+                self.assertEqual(obj.report.counters['bulletins_carried'], 2)
+                store = type(store)(store.path)
+                self.assertEqual(sorted(store.manifest.bulletins), ['2008-01-01', '2008-02-01', '2021-01-01', '2021-02-01'])
+                pd.testing.assert_frame_equal(store.read(end='2008-12-31').astype({'EBn': str, 'country': str}),
+                                                backfill.astype({'EBn': str, 'country': str}))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -1,6 +1,10 @@
 from tools import data
+import pandas as pd
+import pathlib
 import unittest
 
+FIXTURES = pathlib.Path(__file__).parent.joinpath('fixtures')
+
 class TestUrlData(unittest.TestCase):
     """
     Test case for data.getUrlData class
@@ -26,6 +30,34 @@ class TestUrlData(unittest.TestCase):
 
         self.assertEqual(result, [16, 0, 0])
 
+    def test_fixture(self):
+        """
+        Test data output from recorded bulletin html, no network access
+        """
+        html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()
+        tables = data.extract_employment_tables(html)
+        self.assertEqual([len(x) for x in tables], [9, 9]) #family & diversity tables skipped
+
+        obj = data.getUrlData(self.url_list[0], html=html)
+        self.assertEqual(len(obj.data), 16)
+        self.assertEqual(list(obj.data['state'].unique()), ['final', 'filing'])
+        self.assertIn('CENTRALAMERICA', obj.data.columns)
+
+    def test_normalize(self):
+        """
+        Test vectorized normalization over several concatenated bulletins
+        """
+        html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()
+        raw = pd.concat([data.parse_bulletin(self.url_list[0], html, normalize=False)]*3)
+        result = data.normalize_frame(raw)
+
+        self.assertEqual(str(result['CHINA'].dtype), 'datetime64[ns]')
+        first = result.iloc[0]
+        self.assertEqual(first['ALL'], pd.Timestamp(2021, 1, 1)) #C->bulletin date
+        self.assertEqual(first['CHINA'], pd.Timestamp(2020, 2, 1)) #01FEB20
+        self.assertTrue(pd.isna(result.iloc[7]['INDIA'])) #U->NaT
+        self.assertEqual(list(result['EBn'].iloc[5:8]), ['Religious Workers', '5th non-regional', '5th regional'])
+
     def tearDown(self) -> None:
         return super().tearDown()
 
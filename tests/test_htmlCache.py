@@ -0,0 +1,100 @@
+from tools import cache, data, synthetic
+from tools.session import fetchSession
+from datetime import datetime
+import tempfile
+import unittest
+
+class TestHtmlCache(unittest.TestCase):
+    """
+    Test case for cache.htmlCache class, no network access
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url_list = [
+                            'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html',
+                            'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-february-2021.html',
+                            'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-march-2021.html'
+                            ]
+
+    def test_offline(self):
+        """
+        stored pages survive a reload of the index, unknown pages return None
+        """
+        obj = cache.htmlCache(cache_dir=self.tmp.name)
+        obj.store(self.url_list[0], b'<html>january</html>', {'ETag': '"abc"'})
+        obj.flush()
+
+        obj = cache.htmlCache(cache_dir=self.tmp.name)
+        self.assertEqual(obj.get(self.url_list[0], offline=True), '<html>january</html>')
+        self.assertIsNone(obj.get(self.url_list[1], offline=True))
+        self.assertEqual(obj.index[self.url_list[0]]['etag'], '"abc"')
+
+    def test_evict(self):
+        """
+        least recently used urls are evicted first, shared content is stored once
+        """
+        obj = cache.htmlCache(cache_dir=self.tmp.name, max_bytes=20)
+        obj.store(self.url_list[0], b'a'*10, {})
+        obj.store(self.url_list[1], b'a'*10, {}) #same content as url 0
+        obj.store(self.url_list[2], b'b'*10, {})
+        obj.get(self.url_list[0], offline=True) #url 1 is now least recently used
+        obj.flush()
+        self.assertEqual(set(obj.index), set(self.url_list))
+
+        obj.max_bytes = 10
+        obj.flush()
+        self.assertEqual(set(obj.index), set(self.url_list[:1]))
+        self.assertIsNone(obj.get(self.url_list[2], offline=True))
+        self.assertEqual(obj.get(self.url_list[0], offline=True), 'a'*10)
+
+    def test_missing(self):
+        """
+        unpublished bulletins cost one HEAD request, then none until the negative cache expires
+        """
+        with synthetic.standInServer(last_bulletin=datetime(2021, 1, 1)) as server:
+            url_list = data.urlGen(datetime(2021, 1, 1), datetime(2021, 2, 1), base_url=server.base_url).url_list
+            obj = cache.htmlCache(cache_dir=self.tmp.name, session=fetchSession(retries=0))
+            self.assertIsNotNone(obj.get(url_list[0], probe=True))
+            self.assertEqual(server.counts['requests'], 2) #HEAD & GET
+            bytes_fetched = server.counts['bytes']
+            self.assertEqual(obj.outcomes[url_list[0]], ('download', bytes_fetched))
+            obj.get(url_list[0])
+            self.assertEqual(obj.outcomes[url_list[0]], ('not_modified', 0)) #revalidated
+            self.assertEqual(server.counts['requests'], 3)
+
+            self.assertIsNone(obj.get(url_list[1], probe=True))
+            self.assertEqual(server.counts['requests'], 4) #HEAD only
+            self.assertEqual(server.counts['bytes'], bytes_fetched)
+            self.assertTrue(obj.known_missing(url_list[1]))
+            obj.flush()
+
+            obj = cache.htmlCache(cache_dir=self.tmp.name, session=fetchSession(retries=0)) #survives a reload
+            self.assertIsNone(obj.get(url_list[1], probe=True))
+            self.assertEqual(server.counts['requests'], 4)
+            self.assertEqual(obj.failures[url_list[1]], 'missing (negative cache)')
+
+            obj.missing_ttl = 0 #expired, checked again
+            server.last_bulletin = datetime(2021, 2, 1) #published since
+            self.assertIsNotNone(obj.get(url_list[1], probe=True))
+            self.assertFalse(obj.known_missing(url_list[1]))
+
+    def test_unexpected_error(self):
+        """
+        any download exception marks the bulletin unfetched instead of escaping into the build
+        """
+        class brokenSession():
+            def get(self, url, headers=None):
+                raise RuntimeError("broken body")
+        obj = cache.htmlCache(cache_dir=self.tmp.name, session=brokenSession())
+        self.assertIsNone(obj.get(self.url_list[0]))
+        self.assertEqual(obj.failures[self.url_list[0]], 'download failed: broken body')
+
+        obj.store(self.url_list[0], b'<html>january</html>', {})
+        self.assertEqual(obj.get(self.url_list[0]), '<html>january</html>') #cached copy
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,44 @@
+from plots import dataset
+import unittest
+
+class TestLiveDataset(unittest.TestCase):
+    """
+    Test case for dataset.liveDataset & dataset.lruCache classes
+    """
+    def setUp(self):
+        self.token = 'v1'
+        self.loads = 0
+        self.cache = dataset.lruCache(maxsize=2)
+
+    def loader(self):
+        self.loads += 1
+        return 'data-{}'.format(self.loads)
+
+    def test_reload(self):
+        """
+        new dataset is swapped in only when the version token changes, swap clears caches
+        """
+        obj = dataset.liveDataset(loader=self.loader, version=lambda: self.token, interval=0, on_swap=[self.cache.clear])
+        self.cache.put((obj.generation, 'INDIA'), 'figure')
+        self.assertEqual(obj.get(), (1, 'data-1'))
+        self.assertFalse(obj.check())
+
+        self.token = 'v2'
+        self.assertTrue(obj.check())
+        self.assertEqual(obj.get(), (2, 'data-2'))
+        self.assertIsNone(self.cache.get((1, 'INDIA')))
+
+    def test_lru(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a') #b is now least recently used
+        self.cache.put('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,77 @@
+from plots import dataset, projection
+from tools import storage
+import pandas as pd
+import unittest
+
+class TestProjection(unittest.TestCase):
+    """
+    Test case for projection.projectionModel & projection.projectionEngine classes
+    """
+    def setUp(self):
+        dates = pd.date_range('2019-01-01', periods=24, freq='MS')
+        rows = []
+        for idx, date in enumerate(dates):
+            rows.append(('2nd', 'final', date, 'INDIA', pd.Timestamp(2010, 1, 1) + pd.Timedelta(days=15*idx))) #15 days per bulletin
+            rows.append(('2nd', 'final', date, 'CHINA', pd.Timestamp(2015, 1, 1))) #stalled
+            rows.append(('1st', 'final', date, 'CHINA', date)) #current
+        self.data = storage.typed(pd.DataFrame(rows, columns=['EBn', 'state', 'date', 'country', 'priority']))
+        self.dataset = dataset.liveDataset(loader=lambda: self.data, version=lambda: 'v1', interval=0)
+
+    def row(self, result, country, ebn):
+        return result.loc[(result['country']==country) & (result['EBn']==ebn)].iloc[0]
+
+    def test_project(self):
+        model = projection.projectionModel(self.data, lookbacks=(6, 12))
+        result = model.project('2011-01-01')
+
+        india = self.row(result, 'INDIA', '2nd')
+        self.assertEqual(india['as_of'], pd.Timestamp(2020, 12, 1))
+        self.assertEqual(india['cutoff'], pd.Timestamp(2010, 1, 1) + pd.Timedelta(days=15*23))
+        self.assertFalse(india['current'])
+        self.assertAlmostEqual(india['rate_12m'], 15*12/365.2425*30.436875, places=0) #~15 days per month
+        remaining = (pd.Timestamp(2011, 1, 1) - india['cutoff']).days
+        rate = (pd.Timedelta(days=15*23) / (pd.Timestamp(2020, 12, 1) - pd.Timestamp(2019, 1, 1)))
+        self.assertLess(abs((india['eta_12m'] - india['as_of']).days - remaining/rate), 20)
+
+        self.assertTrue(pd.isna(self.row(model.project('2016-01-01'), 'CHINA', '2nd')['eta_6m'])) #not advancing
+        self.assertTrue(self.row(model.project('2014-06-01'), 'CHINA', '2nd')['current'])
+        self.assertTrue(self.row(result, 'CHINA', '1st')['current'])
+
+    def test_unavailable(self):
+        """
+        a series whose latest bulletin is U is unavailable, even if an earlier cutoff covers the priority date
+        """
+        data = self.data.copy()
+        latest = (data['country']=='INDIA') & (data['date']==data['date'].max())
+        data.loc[latest, 'priority'] = pd.NaT
+        india = self.row(projection.projectionModel(data, lookbacks=(12,)).project('2009-01-01'), 'INDIA', '2nd')
+        self.assertTrue(india['unavailable'])
+        self.assertFalse(india['current'])
+        self.assertEqual(india['as_of'], pd.Timestamp(2020, 12, 1))
+        self.assertTrue(pd.isna(india['eta_12m']))
+
+    def test_empty(self):
+        """
+        no data yet->empty projection instead of an error
+        """
+        model = projection.projectionModel(storage.empty_long(), lookbacks=(12,))
+        self.assertEqual(len(model.project('2011-01-01').index), 0)
+
+    def test_engine(self):
+        """
+        answers are cached per generation & priority date, a new dataset is refitted
+        """
+        engine = projection.projectionEngine(self.dataset, lookbacks=(12,))
+        first = engine.project('2011-01-01')
+        self.assertIs(engine.project(pd.Timestamp(2011, 1, 1)), first)
+
+        self.data = self.data.loc[self.data['country']=='INDIA']
+        self.dataset.version = lambda: 'v2'
+        self.dataset.check()
+        self.assertEqual(len(engine.project('2011-01-01')), 1)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,42 @@
+from tools import data
+import threading
+import time
+import unittest
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test case for data.rateLimiter class
+    """
+    def setUp(self):
+        self.url_a = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
+        self.url_b = 'https://example.com/page.html'
+
+    def test_spacing(self):
+        """
+        requests to the same host are spaced by 1/rate, other hosts aren't delayed
+        """
+        limiter = data.rateLimiter(rate=20)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait, args=(self.url_a,)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic()-start, 4*0.05)
+
+        start = time.monotonic()
+        limiter.wait(self.url_b)
+        self.assertLess(time.monotonic()-start, 0.05)
+
+    def test_disabled(self):
+        limiter = data.rateLimiter(rate=None)
+        start = time.monotonic()
+        for _ in range(10):
+            limiter.wait(self.url_a)
+        self.assertLess(time.monotonic()-start, 0.05)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
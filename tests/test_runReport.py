@@ -0,0 +1,101 @@
+from tools import data, instrument
+from tools.cache import htmlCache
+from datetime import datetime
+import json
+import pandas as pd
+import pathlib
+import tempfile
+import unittest
+
+FIXTURES = pathlib.Path(__file__).parent.joinpath('fixtures')
+
+class TestRunReport(unittest.TestCase):
+    """
+    Test case for instrument.runReport class & its use in data.buildDatabase
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_report(self):
+        """
+        offline build from a cache holding one of two bulletins: stage timings, counters & failure reasons
+        """
+        tmp = pathlib.Path(self.tmp.name)
+        url_list = data.urlGen(start_dt=datetime(2021, 1, 1), end_dt=datetime(2021, 2, 1)).url_list
+        cache = htmlCache(cache_dir=tmp.joinpath('cache'))
+        cache.store(url_list[0], FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_bytes(), {})
+
+        store = data.storage.csvStore(tmp.joinpath('datalog.csv'))
+        with self.assertRaises(data.IncompleteBuild): #report is written, partial rebuild isn't committed
+            data.buildDatabase(all=True, offline=True, cache=cache, workers=1,
+                                    store=store, snapshot=None, cube=None, derived=tmp.joinpath('derived.pkl'),
+                                    start=datetime(2021, 1, 1), end=datetime(2021, 2, 1),
+                                    report_path=tmp.joinpath('report.json'), prometheus_path=tmp.joinpath('report.prom'))
+        self.assertFalse(store.exists())
+        report = json.loads(tmp.joinpath('report.json').read_text())
+
+        self.assertEqual(report['counters']['bulletins_requested'], 2)
+        self.assertEqual(report['counters']['bulletins_parsed'], 1)
+        self.assertEqual(report['counters']['cache_hits'], 1)
+        self.assertNotIn('bytes_fetched', report['counters']) #offline, nothing transferred
+        self.assertEqual(report['counters']['rows'], 16)
+        self.assertEqual(report['failures'], {url_list[1]: 'not in cache (offline)'})
+        for stage in ['url_generation', 'validation', 'fetch', 'table_detection', 'combine_tables', 'column_operations', 'normalization']:
+            self.assertIn(stage, report['stages'])
+        self.assertEqual(report['stages']['normalization']['count'], 1) #once per batch, not per bulletin
+        self.assertNotIn('normalization_s', report['slowest_bulletins'][0])
+        self.assertEqual(report['slowest_bulletins'][0]['rows'], 16)
+        self.assertIn('visa_bulletin_ingest_stage_seconds_total{stage="fetch"}', tmp.joinpath('report.prom').read_text())
+
+    def test_failed_rebuild(self):
+        """
+        a full rebuild that couldn't fetch every bulletin keeps the previous datalog
+        """
+        tmp = pathlib.Path(self.tmp.name)
+        url_list = data.urlGen(start_dt=datetime(2021, 1, 1), end_dt=datetime(2021, 2, 1)).url_list
+        store = data.storage.csvStore(tmp.joinpath('datalog.csv'))
+        html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()
+        store.write(data.getUrlData(url_list[0], html=html).data)
+        generation = store.manifest.generation
+
+        with self.assertRaises(data.IncompleteBuild):
+            data.buildDatabase(all=True, offline=True, cache=htmlCache(cache_dir=tmp.joinpath('empty')), workers=1,
+                                    store=store, snapshot=None, cube=tmp.joinpath('cube'), derived=None, report_path=None,
+                                    start=datetime(2021, 1, 1), end=datetime(2021, 2, 1))
+        store = data.storage.csvStore(tmp.joinpath('datalog.csv'))
+        self.assertEqual(store.manifest.generation, generation)
+        self.assertEqual(sorted(store.manifest.bulletins), ['2021-01-01'])
+        self.assertFalse(tmp.joinpath('cube').exists()) #nothing published
+
+    def test_failed_append(self):
+        """
+        an update stops at the first bulletin that couldn't be fetched, so the next run fetches it instead of leaving a hole
+        """
+        tmp = pathlib.Path(self.tmp.name)
+        url_list = data.urlGen(start_dt=datetime(2020, 12, 1), end_dt=datetime(2021, 3, 1)).url_list
+        html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_bytes()
+        store = data.storage.csvStore(tmp.joinpath('datalog.csv'))
+        store.write(data.getUrlData(url_list[0], html=html.decode()).data)
+        cache = htmlCache(cache_dir=tmp.joinpath('cache'))
+        for url in [url_list[1], url_list[3]]: #february missing
+            cache.store(url, html, {})
+
+        with self.assertRaises(data.IncompleteBuild):
+            data.buildDatabase(all=False, offline=True, cache=cache, workers=2, store=store, snapshot=None, cube=None,
+                                    derived=None, report_path=None, end=datetime(2021, 3, 1))
+        store = data.storage.csvStore(tmp.joinpath('datalog.csv'))
+        self.assertEqual(store.latest_date(), pd.Timestamp(2021, 1, 1))
+
+    def test_timed(self):
+        timings = {}
+        for _ in range(2):
+            with instrument.timed(timings, 'parse'):
+                pass
+        self.assertEqual(list(timings), ['parse'])
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,60 @@
+from plots import api, dataset
+from tools import data, storage
+from flask import Flask
+from flask_compress import Compress
+import gzip
+import json
+import pathlib
+import unittest
+
+FIXTURE = pathlib.Path(__file__).parent.joinpath('fixtures', 'visa-bulletin-for-january-2021.html')
+URL = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
+
+class TestSeriesApi(unittest.TestCase):
+    """
+    Test case for api.seriesApi & api.seriesIndex classes
+    """
+    def setUp(self):
+        self.data = storage.to_long(data.getUrlData(URL, html=FIXTURE.read_text()).data)
+        self.dataset = dataset.liveDataset(loader=lambda: self.data, version=lambda: 'v1', interval=0)
+        self.server = Flask(__name__)
+        Compress(self.server)
+        self.api = api.seriesApi(self.dataset)
+        self.api.init_app(self.server)
+        self.client = self.server.test_client()
+
+    def test_series(self):
+        response = self.client.get('/api/series?country=INDIA&ebn=2nd&state=final')
+        body = response.get_json()
+        self.assertEqual(len(body['series']), 1)
+        series = body['series'][0]
+        expected = storage.filter_long(self.data, countries=['INDIA'], ebns=['2nd'], states=['final'])
+        self.assertEqual(series['date'], ['2021-01-01'])
+        self.assertEqual(series['priority'], list(expected['priority'].dt.strftime('%Y-%m-%d')))
+
+        body = self.client.get('/api/series?ebn=2nd&ebn=3rd').get_json()
+        self.assertEqual(len(body['series']), 2*2*self.data['country'].nunique())
+        self.assertEqual(self.client.get('/api/series?country=NOWHERE').get_json()['series'], [])
+        self.assertEqual(self.client.get('/api/series?month=1').status_code, 400)
+
+    def test_etag(self):
+        """
+        unchanged dataset answers 304, compressed responses keep the weak ETag
+        """
+        response = self.client.get('/api/series', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))['series']), len(self.api.get_index().series))
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(self.client.get('/api/series', headers={'If-None-Match': etag}).status_code, 304)
+
+        self.data = self.data.iloc[1:] #new dataset generation, new version
+        self.dataset.version = lambda: 'v2'
+        self.dataset.check()
+        self.assertEqual(self.client.get('/api/series', headers={'If-None-Match': etag}).status_code, 200)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
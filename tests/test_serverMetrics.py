@@ -0,0 +1,51 @@
+from plots import metrics
+from flask import Flask
+from flask_compress import Compress
+import unittest
+
+class TestServerMetrics(unittest.TestCase):
+    """
+    Test case for metrics.serverMetrics class
+    """
+    def setUp(self):
+        self.server = Flask(__name__)
+        self.metrics = metrics.serverMetrics(prefix='test')
+        self.metrics.init_app(self.server)
+        self.metrics.gauge('generation', lambda: 7)
+
+        @self.server.route('/_dash-update-component', methods=['POST'])
+        @self.metrics.timed('callback_seconds')
+        def update_figure():
+            return 'x'*2000
+
+    def test_metrics(self):
+        client = self.server.test_client()
+        client.post('/_dash-update-component', json={'output': 'country-figure.data'})
+        text = client.get('/metrics').data.decode()
+
+        labels = 'callback="country-figure.data",path="/_dash-update-component"'
+        self.assertIn('test_request_seconds_count{' + labels + '} 1', text)
+        self.assertIn('test_response_bytes_bucket{' + labels.replace(',', ',le="10000.0",', 1) + '} 1', text)
+        self.assertIn('test_callback_seconds_count{callback="update_figure"} 1', text)
+        self.assertIn('test_generation 7', text)
+
+    def test_compressed_size(self):
+        """
+        response sizes are recorded as sent, after compression
+        """
+        server = Flask(__name__)
+        Compress(server) #registered first, as Dash(compress=True) does
+        obj = metrics.serverMetrics(prefix='test')
+        obj.init_app(server)
+        server.add_url_rule('/api/series', 'series', lambda: 'x'*200000)
+
+        response = server.test_client().get('/api/series', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        text = obj.render()
+        self.assertIn('test_response_bytes_sum{{path="/api/series"}} {}'.format(float(len(response.data))), text)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
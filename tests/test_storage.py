@@ -0,0 +1,157 @@
+from tools import data, storage
+import os
+import pandas as pd
+import pathlib
+import tempfile
+import unittest
+
+FIXTURES = pathlib.Path(__file__).parent.joinpath('fixtures')
+
+class TestStorage(unittest.TestCase):
+    """
+    Test case for storage.csvStore & storage.parquetStore classes
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
+        html = FIXTURES.joinpath('visa-bulletin-for-january-2021.html').read_text()
+        january = data.getUrlData(url, html=html).data
+        october = january.copy() #next fiscal year
+        october['date'] = pd.Timestamp(2021, 10, 1)
+        self.data = pd.concat([january, october])
+
+        self.stores = [storage.csvStore(pathlib.Path(self.tmp.name).joinpath('datalog.csv'))]
+        if storage.pa is not None:
+            self.stores.append(storage.parquetStore(pathlib.Path(self.tmp.name).joinpath('datalog')))
+
+    def test_roundtrip(self):
+        """
+        written bulletins read back typed, in long format & as the same wide csv
+        """
+        for store in self.stores:
+            self.assertFalse(store.exists())
+            store.write(self.data.iloc[:16])
+            store.append(self.data.iloc[16:])
+            self.assertEqual(store.latest_date(), pd.Timestamp(2021, 10, 1))
+
+            result = store.read()
+            self.assertEqual(len(result), 2*16*7) #U cells kept as NaT
+            self.assertEqual(str(result['priority'].dtype), 'datetime64[ns]')
+            self.assertEqual(str(result['country'].dtype), 'category')
+
+            path = pathlib.Path(self.tmp.name).joinpath('export.csv')
+            store.to_csv(path)
+            exported = storage.csvStore(path).read_wide()
+            self.assertEqual(exported.shape, self.data.shape)
+
+    def test_filters(self):
+        for store in self.stores:
+            store.write(self.data)
+            result = store.read(countries=['INDIA'], states=['final'], ebns=['2nd'], start='2021-06-01')
+            self.assertEqual(len(result), 1)
+            self.assertEqual(result.iloc[0]['priority'], pd.Timestamp(2009, 7, 8))
+
+    def test_append_only(self):
+        """
+        appends skip ingested bulletins, bump the manifest generation & never rewrite old data
+        """
+        for store in self.stores:
+            store.write(self.data.iloc[:16])
+            generation = store.manifest.generation
+            store.append(self.data) #january already ingested
+            self.assertEqual(sorted(store.manifest.bulletins), ['2021-01-01', '2021-10-01'])
+            self.assertEqual(store.manifest.generation, generation+1)
+            self.assertEqual(len(store.read()), 2*16*7)
+
+    def test_interrupted_append(self):
+        """
+        bytes appended to the csv after the last manifest commit are rolled back
+        """
+        store = self.stores[0]
+        store.write(self.data.iloc[:16])
+        with open(store.path, 'a') as f:
+            f.write('1st,2021-10-01,') #crash mid-row
+        store = storage.csvStore(store.path)
+        self.assertEqual(store.latest_date(), pd.Timestamp(2021, 1, 1))
+        store.append(self.data.iloc[16:])
+        self.assertEqual(len(store.read_wide()), 32)
+
+    def test_writer(self):
+        """
+        bulletins streamed one at a time equal a single write, an aborted rewrite keeps the old datalog
+        """
+        for store in self.stores:
+            with store.writer(replace=True) as sink:
+                sink.add(self.data.iloc[:16])
+                sink.add(self.data.iloc[16:].drop(columns=['INDIA'])) #column added later
+                sink.add(self.data.iloc[16:]) #already in this rewrite
+            self.assertEqual(sorted(sink.bulletins), ['2021-01-01', '2021-10-01'])
+            self.assertEqual(len(store.read()), 2*16*6 + 16)
+            generation = store.manifest.generation
+
+            with self.assertRaises(RuntimeError):
+                with store.writer(replace=True) as sink:
+                    sink.add(self.data.iloc[:16])
+                    raise RuntimeError("crash")
+            store = type(store)(store.path)
+            self.assertEqual(store.manifest.generation, generation)
+            self.assertEqual(len(store.read()), 2*16*6 + 16)
+
+    def test_writer_new_column(self):
+        """
+        a country column first seen in a later bulletin keeps every date of the rewritten csv in one format
+        """
+        store = self.stores[0]
+        with store.writer(replace=True) as sink:
+            sink.add(self.data.iloc[:16].drop(columns=['INDIA']))
+            sink.add(self.data.iloc[16:])
+        dates = pd.read_csv(store.path, dtype=str, usecols=['date'])['date']
+        self.assertEqual(sorted(dates.unique()), ['2021-01-01', '2021-10-01'])
+        result = store.read_wide()
+        self.assertEqual(sorted(result.columns), sorted(self.data.columns))
+        self.assertEqual(result['INDIA'].isna().sum(), 16 + self.data.iloc[16:]['INDIA'].isna().sum()) #column missing from january
+
+    @unittest.skipIf(storage.pa is None, "pyarrow not installed")
+    def test_interrupted_swap(self):
+        """
+        a crash between the two renames of a parquet rewrite keeps a dataset: the old one, or the new one once complete
+        readers leave the directories alone, the next writer finishes the swap
+        """
+        path = pathlib.Path(self.tmp.name).joinpath('datalog')
+        storage.parquetStore(path).write(self.data.iloc[:16])
+        os.replace(path, path.with_name('datalog.old')) #crash before the new dataset was moved in
+        self.assertFalse(storage.parquetStore(path).exists())
+        self.assertTrue(path.with_name('datalog.old').is_dir())
+        store = storage.parquetStore(path)
+        store.append(self.data.iloc[:16]) #already ingested once restored
+        self.assertEqual(sorted(store.manifest.bulletins), ['2021-01-01'])
+        self.assertEqual(len(store.read()), 16*7)
+
+        storage.parquetStore(path.with_name('datalog.tmp')).write(self.data) #complete new dataset
+        os.replace(path, path.with_name('datalog.old'))
+        self.assertTrue(pd.isna(storage.parquetStore(path).latest_date())) #reader
+        self.assertTrue(path.with_name('datalog.tmp').is_dir())
+        store = storage.parquetStore(path)
+        store.recover()
+        self.assertEqual(sorted(store.manifest.bulletins), ['2021-01-01', '2021-10-01'])
+        self.assertFalse(path.with_name('datalog.old').exists())
+        self.assertEqual(len(store.read()), 2*16*7)
+
+    def test_snapshot(self):
+        """
+        snapshot keeps the typed long frame & generation, missing snapshot reads as None
+        """
+        path = pathlib.Path(self.tmp.name).joinpath('snapshot.pkl')
+        self.assertIsNone(storage.read_snapshot(path))
+        long = storage.to_long(self.data)
+        storage.write_snapshot(long, 3, path)
+        result, generation = storage.read_snapshot(path)
+        self.assertEqual(generation, 3)
+        pd.testing.assert_frame_equal(result, long)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
@@ -0,0 +1,34 @@
+from tools import data, synthetic
+from datetime import datetime
+import requests
+import unittest
+
+class TestSynthetic(unittest.TestCase):
+    """
+    Test case for synthetic.bulletinGenerator & synthetic.standInServer classes
+    """
+    def setUp(self):
+        self.server = synthetic.standInServer(last_bulletin=datetime(2021, 1, 1))
+        self.server.start()
+
+    def test_pages(self):
+        """
+        generated pages parse like real bulletins, columns follow the country schedule
+        """
+        url_list = data.urlGen(start_dt=datetime(2016, 1, 1), end_dt=datetime(2021, 2, 1), base_url=self.server.base_url).url_list
+        first = data.getUrlData(url_list[0], html=requests.get(url_list[0]).text).data
+        self.assertEqual(len(first), 16)
+        self.assertNotIn('CENTRALAMERICA', first.columns)
+
+        response = requests.get(url_list[-2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(requests.get(url_list[-2]).text, response.text) #deterministic
+        self.assertEqual(requests.get(url_list[-2], headers={'If-None-Match': response.headers['ETag']}).status_code, 304)
+        self.assertEqual(requests.head(url_list[-1]).status_code, 404) #not published yet
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
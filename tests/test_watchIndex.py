@@ -0,0 +1,58 @@
+from tools import storage, watches
+import numpy as np
+import pandas as pd
+import unittest
+
+class TestWatchIndex(unittest.TestCase):
+    """
+    Test case for watches.watchIndex class
+    """
+    def setUp(self):
+        dates = pd.date_range('2021-01-01', periods=5, freq='MS')
+        final = [pd.Timestamp(2010, 1, 1), pd.Timestamp(2010, 6, 1), pd.Timestamp(2010, 3, 1), pd.NaT, pd.Timestamp(2011, 1, 1)]
+        filing = [pd.Timestamp(2012, 1, 1), pd.Timestamp(2012, 1, 1), pd.Timestamp(2012, 1, 1), pd.Timestamp(2012, 1, 1), pd.Timestamp(2009, 1, 1)]
+        rows = []
+        for date, f, g in zip(dates, final, filing):
+            rows.append(('2nd', 'final', date, 'INDIA', f))
+            rows.append(('2nd', 'filing', date, 'INDIA', g))
+            rows.append(('3rd', 'final', date, 'CHINA', date)) #current
+            rows.append(('3rd', 'filing', date, 'CHINA', date))
+        self.data = storage.typed(pd.DataFrame(rows, columns=['EBn', 'state', 'date', 'country', 'priority']))
+        self.index = watches.watchIndex(self.data)
+
+    def test_evaluate(self):
+        watchlist = pd.DataFrame({
+            'employee': ['a', 'b', 'c', 'd', 'e', 'f'],
+            'priority_date': ['2010-05-01', '2010-12-01', '2012-01-01', '2020-01-01', '2010-05-01', None],
+            'country': ['INDIA', 'INDIA', 'INDIA', 'CHINA', 'MEXICO', 'INDIA'],
+            'EBn': ['2nd', '2nd', '2nd', '3rd', '2nd', '2nd'],
+        })
+        result = self.index.evaluate(watchlist)
+        self.assertEqual(list(result['employee']), list(watchlist['employee'])) #passed through
+        self.assertEqual(list(result['current_final']), [True, True, False, True, False, False])
+        self.assertEqual(list(result['first_current_final'].dt.strftime('%Y-%m-%d').fillna('')),
+                            ['2021-02-01', '2021-05-01', '', '2021-01-01', '', ''])
+        self.assertEqual(list(result['current_filing']), [False, False, False, True, False, False]) #filing retrogressed
+        self.assertEqual(list(result['first_current_filing'].dt.strftime('%Y-%m-%d').fillna('')),
+                            ['2021-01-01', '2021-01-01', '2021-01-01', '2021-01-01', '', ''])
+
+    def test_random(self):
+        """
+        same answers as a loop over bulletins
+        """
+        rng = np.random.default_rng(0)
+        watchlist = pd.DataFrame({
+            'priority_date': pd.Timestamp(2009, 6, 1) + pd.to_timedelta(rng.integers(0, 1200, 200), unit='D'),
+            'country': 'INDIA', 'EBn': '2nd',
+        })
+        result = self.index.evaluate(watchlist, states=['final'])
+        series = self.data.loc[(self.data['country']=='INDIA') & (self.data['state']=='final')].sort_values('date')
+        for watch, first in zip(watchlist['priority_date'], result['first_current_final']):
+            current = series.loc[series['priority']>=watch, 'date']
+            self.assertEqual(str(first), str(current.min() if len(current) else pd.NaT))
+
+    def tearDown(self) -> None:
+        return super().tearDown()
+
+if __name__ == '__main__':
+    unittest.main() #command line interface to this test script
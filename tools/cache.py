@@ -0,0 +1,213 @@
+#file manipulation
+import hashlib
+import json
+import os
+import pathlib
+
+import threading
+import time
+
+#import global variables
+import tools.variables as variables
+
+#pooled http session
+from tools.session import get_session, BulletinMissing
+
+"""
+Class definitions
+"""
+
+class htmlCache():
+    """
+    Content-addressed, size-bounded local cache of raw bulletin html
+    Pages are stored once per content hash as <sha256>.html, index.json maps
+    url -> {sha, etag, last_modified, size, atime}
+    Urls that answered 404/410 are remembered in missing.json (url -> time checked)
+    and not requested again for missing_ttl seconds
+    Inputs:
+        cache_dir: directory holding pages & index
+        max_bytes: total size of stored pages before least recently used urls are evicted
+        session: fetchSession used for downloads, shared session if None
+        missing_ttl: seconds a missing url is answered from the negative cache
+    """
+    def __init__(self, cache_dir=variables.CACHE_DIR, max_bytes=variables.CACHE_MAX_BYTES, session=None,
+                    missing_ttl=variables.MISSING_TTL):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.session = session
+        self.max_bytes = max_bytes
+        self.missing_ttl = missing_ttl
+        self.index_path = self.cache_dir.joinpath('index.json')
+        self.missing_path = self.cache_dir.joinpath('missing.json')
+        self.lock = threading.Lock()
+        self.failures = {} #{url: reason the last get returned None}
+        self.outcomes = {} #{url: (how the last get was answered: 'download'|'not_modified'|'cache', bytes received)}
+        self.load_index()
+
+    def load_index(self):
+        self.index = self.load_json(self.index_path)
+        self.missing = self.load_json(self.missing_path)
+
+    @staticmethod
+    def load_json(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def known_missing(self, url):
+        """
+        Output:
+            True if url answered 404/410 less than missing_ttl seconds ago
+        """
+        with self.lock:
+            checked = self.missing.get(url)
+        return checked is not None and time.time()-checked<self.missing_ttl
+
+    def mark_missing(self, url, reason):
+        with self.lock:
+            self.missing[url] = time.time()
+        return self.fail(url, f"missing: {reason}")
+
+    def fail(self, url, reason):
+        with self.lock:
+            self.failures[url] = reason
+        return None
+
+    def outcome(self, url, how, received=0):
+        with self.lock:
+            self.outcomes[url] = (how, received)
+
+    def blob_path(self, sha):
+        return self.cache_dir.joinpath(sha + '.html')
+
+    def get(self, url, offline=False, probe=False):
+        """
+        Input:
+            url: bulletin url
+            offline: True->only return cached pages, never touch the network
+            probe: True->check that an uncached page exists with a HEAD request before downloading it,
+                for bulletins that may not be published yet
+        Output:
+            html as string, None if page is unavailable
+        """
+        with self.lock:
+            entry = self.index.get(url)
+        if offline:
+            self.outcome(url, 'cache')
+            return self.read(url, entry) if entry else self.fail(url, 'not in cache (offline)')
+        session = self.session or get_session()
+
+        if not entry:
+            if self.known_missing(url):
+                return self.fail(url, 'missing (negative cache)')
+            if probe:
+                try:
+                    session.head(url)
+                except BulletinMissing as e:
+                    return self.mark_missing(url, e)
+                except Exception:
+                    pass #inconclusive, the download decides
+
+        #revalidate cached page, published bulletins normally answer 304
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = session.get(url, headers=headers)
+        except BulletinMissing as e:
+            return self.mark_missing(url, e)
+        except Exception as e: #FetchError or an unexpected failure, the bulletin counts as unfetched instead of ending the build
+            print(f"Exception during download {e}")
+            print(f"url: {url}")
+            self.outcome(url, 'cache')
+            return self.read(url, entry) if entry else self.fail(url, f"download failed: {e}") #fall back to cached copy
+
+        if response.status_code==304 and entry:
+            self.outcome(url, 'not_modified')
+            return self.read(url, entry)
+        if response.status_code==200:
+            self.outcome(url, 'download', len(response.content))
+            return self.store(url, response.content, response.headers)
+        return self.fail(url, f"HTTP {response.status_code}")
+
+    def read(self, url, entry):
+        """
+        read cached page & mark url as recently used
+        """
+        try:
+            content = self.blob_path(entry['sha']).read_bytes()
+        except FileNotFoundError: #blob removed outside of the cache
+            with self.lock:
+                self.index.pop(url, None)
+            return self.fail(url, 'cached page missing')
+        with self.lock:
+            entry['atime'] = time.time()
+        return content.decode('utf-8', errors='replace')
+
+    def store(self, url, content, headers):
+        """
+        write page to disk (skipped if identical content exists) & update index
+        """
+        sha = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha)
+        if not path.is_file():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp{}'.format(threading.get_ident()))
+            tmp.write_bytes(content)
+            os.replace(tmp, path) #readers never see a partial page
+        with self.lock:
+            self.missing.pop(url, None) #published since
+            self.index[url] = {
+                'sha': sha,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'size': len(content),
+                'atime': time.time(),
+            }
+        return content.decode('utf-8', errors='replace')
+
+    def evict(self):
+        """
+        drop least recently used urls until stored pages fit in max_bytes
+        a page is deleted once no url references its content
+        """
+        with self.lock:
+            refs = {}
+            for entry in self.index.values():
+                refs[entry['sha']] = refs.get(entry['sha'], 0) + 1
+            total = sum({e['sha']:e['size'] for e in self.index.values()}.values())
+            for url, entry in sorted(self.index.items(), key=lambda kv: kv[1]['atime']):
+                if total<=self.max_bytes:
+                    break
+                del self.index[url]
+                refs[entry['sha']] -= 1
+                if refs[entry['sha']]==0:
+                    try:
+                        self.blob_path(entry['sha']).unlink()
+                    except FileNotFoundError: #removed outside of the cache
+                        pass
+                    total -= entry['size']
+
+    def flush(self):
+        """
+        apply eviction policy, drop expired missing urls & persist index
+        """
+        self.evict()
+        with self.lock:
+            now = time.time()
+            self.missing = {url:checked for url, checked in self.missing.items() if now-checked<self.missing_ttl}
+            self.dump(self.index, self.index_path)
+            self.dump(self.missing, self.missing_path)
+
+    def dump(self, obj, path):
+        if not obj and not path.is_file():
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
@@ -0,0 +1,77 @@
+import pandas as pd
+
+#file manipulation
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+
+#import global variables
+import tools.variables as variables
+
+"""
+Class definitions
+"""
+
+class backfillJournal():
+    """
+    Progress journal & per-bulletin results of a long build, lets an interrupted run skip finished bulletins
+    Each parsed bulletin is pickled to <path>/<sha1 of url>.pkl, then recorded in <path>/journal.json,
+    both via temporary file & rename, so the journal only lists complete results
+    Inputs:
+        path: checkpoint directory
+    """
+    def __init__(self, path=variables.CHECKPOINT_DIR):
+        self.path = pathlib.Path(path)
+        self.journal_path = self.path.joinpath('journal.json')
+        self.lock = threading.Lock()
+        try:
+            with open(self.journal_path) as f:
+                self.done = json.load(f)['done'] #{url: result file name}
+        except (FileNotFoundError, ValueError, KeyError):
+            self.done = {}
+
+    def __len__(self):
+        return len(self.done)
+
+    def load(self, url):
+        """
+        Output:
+            saved dataframe for url, None if url isn't finished
+        """
+        with self.lock:
+            name = self.done.get(url)
+        if name is None:
+            return None
+        try:
+            return pd.read_pickle(self.path.joinpath(name))
+        except Exception: #result file lost, fetch again
+            with self.lock:
+                self.done.pop(url, None)
+            return None
+
+    def save(self, url, data):
+        """
+        save parsed bulletin for url & mark it finished
+        """
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest() + '.pkl'
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.joinpath('.' + name + '.tmp')
+        data.to_pickle(tmp)
+        os.replace(tmp, self.path.joinpath(name))
+        with self.lock:
+            self.done[url] = name
+            tmp = self.journal_path.with_name('.journal.json.tmp')
+            with open(tmp, 'w') as f:
+                json.dump({'done': self.done}, f)
+            os.replace(tmp, self.journal_path)
+
+    def clear(self):
+        """
+        remove journal & results once the build is written to the store
+        """
+        with self.lock:
+            self.done = {}
+            shutil.rmtree(self.path, ignore_errors=True)
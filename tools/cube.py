@@ -0,0 +1,250 @@
+import pandas as pd
+import numpy as np
+
+#file manipulation
+import json
+import os
+import pathlib
+
+#import global variables
+import tools.variables as variables
+import tools.storage as storage
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+MISSING = np.iinfo(np.int32).min #series not listed in the bulletin
+UNAVAILABLE = MISSING + 1 #listed without a cutoff (U)
+AXES = ('date', 'EBn', 'state', 'country')
+
+"""
+Function definitions
+"""
+
+def to_dates(days):
+    """
+    Input:
+        int32 day numbers (array or view), sentinels for missing & unavailable cells
+    Output:
+        datetime64[ns] array of the same shape, NaT for both sentinels
+    """
+    days = np.asarray(days)
+    dates = (EPOCH + days.astype('int64')).astype('datetime64[ns]')
+    dates[days<=UNAVAILABLE] = np.datetime64('NaT')
+    return dates
+
+def as_cube(data):
+    """
+    Output:
+        data if it is a datasetCube, else a cube built from typed long dataframe data
+    """
+    return data if isinstance(data, datasetCube) else datasetCube.from_long(data)
+
+def as_long(data):
+    """
+    Output:
+        typed long dataframe of a datasetCube or of a long dataframe
+    """
+    return data.to_long() if isinstance(data, datasetCube) else data
+
+def write_cube(data, generation, path=variables.CUBE_DIR, keep=2, build=''):
+    """
+    Input:
+        data: typed long dataframe or datasetCube
+        generation: manifest generation data was read at
+        path: cube directory
+        keep: generations kept on disk, readers may still map the previous one
+        build: manifest build id, generations restart at 1 in a new store
+    cube-<generation>[-<build>].npy & .json (labels) are written via temporary files & rename, then
+    current.json is switched to them, so readers see either generation, never a mix
+    nothing is written if generation of the same build is already the current one
+    """
+    path = pathlib.Path(path)
+    if published_version(path)==(build, generation): #unchanged, a new current.json would make every worker reload
+        return
+    cube = as_cube(data)
+    path.mkdir(parents=True, exist_ok=True)
+    name = 'cube-{}'.format(generation) + ('-' + build[:12] if build else '')
+
+    tmp = path.joinpath('.' + name + '.npy.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, np.ascontiguousarray(cube.values))
+    os.replace(tmp, path.joinpath(name + '.npy'))
+    labels = {axis:[str(label) for label in cube.labels[axis]] for axis in AXES}
+    storage.atomic_write_json(labels, path.joinpath(name + '.json'))
+    storage.atomic_write_json({'generation': generation, 'build': build, 'name': name}, path.joinpath('current.json'))
+
+    #older generations, unlinking a file another process has mapped is safe on posix
+    names = sorted({p.stem for p in path.glob('cube-*.npy')} - {name}, key=lambda n: int(n.split('-')[1]))
+    for old in names[:max(len(names)-(keep-1), 0)]:
+        for suffix in ['.npy', '.json']:
+            try:
+                path.joinpath(old + suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+def published_version(path=variables.CUBE_DIR):
+    """
+    Output:
+        (build, generation) of the current cube in path, None if no cube was written
+    """
+    try:
+        with open(pathlib.Path(path).joinpath('current.json')) as f:
+            current = json.load(f)
+        if pathlib.Path(path).joinpath(current['name'] + '.npy').is_file():
+            return current.get('build', ''), current['generation']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    return None
+
+def read_cube(path=variables.CUBE_DIR, mmap=True):
+    """
+    Output:
+        (datasetCube, generation), None if no cube was written
+        values are a read-only memory map, every process mapping the file shares its pages
+    """
+    path = pathlib.Path(path)
+    try:
+        with open(path.joinpath('current.json')) as f:
+            current = json.load(f)
+        with open(path.joinpath(current['name'] + '.json')) as f:
+            labels = json.load(f)
+        values = np.load(path.joinpath(current['name'] + '.npy'), mmap_mode='r' if mmap else None)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    labels['date'] = np.array(labels['date'], dtype='datetime64[D]')
+    for axis in ['EBn', 'state', 'country']:
+        labels[axis] = np.array(labels[axis], dtype=object)
+    return datasetCube(values, labels), current['generation']
+
+def cube_version(path=variables.CUBE_DIR):
+    """
+    Output:
+        cheap token that changes when a new cube generation is published or the app's other data sources change
+    """
+    try:
+        stat = os.stat(pathlib.Path(path).joinpath('current.json'))
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) #rename gives a new inode
+    except FileNotFoundError:
+        return storage.dataset_version()
+
+def load_cube(path=variables.CUBE_DIR):
+    """
+    Output:
+        memory-mapped datasetCube written by buildDatabase, built from storage.load_dataset if there is none
+    """
+    cube = read_cube(path)
+    if cube is not None:
+        return cube[0]
+    return datasetCube.from_long(storage.load_dataset()) #private copy
+
+"""
+Class definitions
+"""
+
+class datasetCube():
+    """
+    Dense [bulletin, EBn, state, country] array of cutoffs as int32 days since epoch
+    Axes are integer coded, codes[axis][label] gives the position of a label, so selecting a
+    series, a country or a bulletin is a numpy view instead of a scan of the long dataframe
+    Cells hold MISSING where the bulletin doesn't list the series & UNAVAILABLE for U cells
+    Inputs:
+        values: int32 array of shape (bulletins, EBn, state, country)
+        labels: {axis: sequence of labels}, for AXES, bulletin dates as datetime64[D]
+    """
+    def __init__(self, values, labels):
+        self.values = values
+        self.labels = {axis:np.asarray(labels[axis]) for axis in AXES}
+        self.codes = {axis:{label:idx for idx, label in enumerate(self.labels[axis].tolist())} for axis in AXES}
+        self.codes['date'] = {pd.Timestamp(label):idx for idx, label in enumerate(self.labels['date'])}
+
+    @classmethod
+    def from_long(cls, data):
+        """
+        Input:
+            data: typed long dataframe
+        Output:
+            datasetCube, EBn & state axes in bulletin order, countries sorted
+        """
+        ebns = [ebn for ebn in variables.EBN_ORDER if ebn in set(data['EBn'].astype(str))]
+        ebns += sorted(set(data['EBn'].astype(str)) - set(ebns))
+        labels = {
+            'date': np.unique(data['date'].to_numpy(dtype='datetime64[D]')),
+            'EBn': np.array(ebns, dtype=object),
+            'state': np.array(variables.STATES, dtype=object),
+            'country': np.array(sorted(data['country'].astype(str).unique()), dtype=object),
+        }
+        positions = []
+        for axis in AXES:
+            column = data[axis].to_numpy(dtype='datetime64[D]') if axis=='date' else data[axis].astype(str).to_numpy()
+            positions.append(pd.Index(labels[axis]).get_indexer(column))
+
+        values = np.full(tuple(len(labels[axis]) for axis in AXES), MISSING, dtype=np.int32)
+        priority = data['priority'].to_numpy(dtype='datetime64[D]')
+        days = np.where(np.isnat(priority), UNAVAILABLE, (priority - EPOCH).astype('int64'))
+        values[tuple(positions)] = days.astype(np.int32)
+        return cls(values, labels)
+
+    def code(self, axis, label):
+        """
+        Output:
+            position of label on axis, KeyError if it isn't there
+        """
+        return self.codes[axis][pd.Timestamp(label) if axis=='date' else label]
+
+    def series(self, country, ebn, state):
+        """
+        Output:
+            view of one series' cutoffs over all bulletins
+        """
+        return self.values[:, self.code('EBn', ebn), self.code('state', state), self.code('country', country)]
+
+    def select(self, **labels):
+        """
+        Input:
+            axis=label or axis=list of labels, e.g. country=['INDIA', 'CHINA']
+        Output:
+            (values, {axis: labels}) for the selection, a view when every axis gets a single label or none
+        """
+        index, selected = [], {}
+        for axis in AXES:
+            value = labels.get(axis)
+            if value is None:
+                index.append(slice(None))
+                selected[axis] = self.labels[axis]
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                codes = [self.code(axis, v) for v in value]
+                index.append(np.array(codes, dtype=np.intp))
+                selected[axis] = self.labels[axis][codes]
+            else:
+                code = self.code(axis, value)
+                index.append(slice(code, code+1))
+                selected[axis] = self.labels[axis][code:code+1]
+        values = self.values
+        for axis, idx in enumerate(index): #one axis at a time, numpy would pair up several index arrays
+            values = values[(slice(None),)*axis + (idx,)]
+        return values, selected
+
+    def to_long(self, **labels):
+        """
+        Input:
+            optional selection, see select
+        Output:
+            typed long dataframe of the listed cells, sorted by bulletin, EBn, state & country
+        """
+        values, selected = self.select(**labels)
+        listed = values!=MISSING
+        positions = np.nonzero(listed)
+        data = pd.DataFrame({axis:selected[axis][positions[idx]] for idx, axis in enumerate(AXES)})
+        data['date'] = data['date'].astype('datetime64[ns]')
+        data['priority'] = to_dates(values[listed])
+        return storage.typed(data[['EBn', 'state', 'date', 'country', 'priority']])
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @property
+    def rows(self):
+        """
+        number of listed cells, rows of to_long
+        """
+        return int(np.count_nonzero(self.values!=MISSING))
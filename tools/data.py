@@ -1,6 +1,5 @@
 import pandas as pd 
 import numpy as np
-import regex as re
 
 #import for url parsing
 from urllib.parse import urlparse, urlunparse, ParseResult
@@ -12,17 +11,208 @@ from validators.url import url
 #import global variables
 import tools.variables as variables
 
+#raw html cache & table extraction
+from tools.cache import htmlCache
+from tools.session import get_session
+import lxml.html
+
+#datalog storage
+import tools.storage as storage
+
+#run instrumentation
+from tools.instrument import runReport, timed
+
+#resumable builds
+from tools.checkpoint import backfillJournal
+
+#derived metrics
+from tools.derived import derivedTable
+
+#dataset file shared by the app's workers
+from tools.cube import published_version, write_cube
+
 #imports for dealing with datetime objects
 from dateutil.rrule import rrule, MONTHLY
+from dateutil.relativedelta import relativedelta
 from datetime import datetime
 
 #file manipulation
 import pathlib
 
+#concurrent fetching
+import collections
+import contextlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+"""
+Function definitions
+"""
+
+def cell_text(cell):
+    """
+    whitespace-normalized text of a table cell, <br> counts as a space
+    """
+    return ' '.join(cell.text_content().split())
+
+def extract_employment_tables(html):
+    """
+    Input:
+        html: raw bulletin page
+    Output:
+        list of dataframes, one per employment-based table in page order,
+        first row holds the raw column names (same layout pd.read_html returns)
+    Only tables whose header row matches variables.EMPLOYMENT_FINGERPRINTS are parsed
+    """
+    root = lxml.html.fromstring(html)
+    for br in root.iter('br'):
+        br.tail = ' ' + (br.tail or '')
+
+    tables = []
+    for table in root.iter('table'):
+        rows = table.xpath('./tr|./tbody/tr|./thead/tr')
+        if not rows:
+            continue
+        header = ' '.join(cell_text(cell) for cell in rows[0].xpath('./td|./th'))
+        if all(any(s in header for s in group) for group in variables.EMPLOYMENT_FINGERPRINTS):
+            tables.append(pd.DataFrame([[cell_text(cell) for cell in row.xpath('./td|./th')] for row in rows]))
+    return tables
+
+def normalize_frame(data):
+    """
+    Vectorized cleanup of raw table cells, for one bulletin or many concatenated bulletins
+    Input:
+        data: EBn, state, date & one column of raw cell strings per country
+    Output:
+        new dataframe, date & country columns as datetime64
+    1. clean up EBn column values
+    2. C->bulletin date
+    3. DDMMMYY->datetime, anything else (U, blanks)->NaT
+    """
+    data = data.copy()
+    data['date'] = pd.to_datetime(data['date'])
+
+    #1. clean up EBn column values
+    ebn = data['EBn'].astype(str)
+    conditions = [ebn.str.contains(pattern, regex=True) for pattern in variables.EBN_CATEGORIES.values()]
+    data['EBn'] = np.select(conditions, list(variables.EBN_CATEGORIES.keys()), default=data['EBn'].to_numpy(dtype=object))
+
+    #2. & 3. all country cells in one flat array, row-major
+    countries = [col for col in data.columns if col not in ['EBn', 'state', 'date']]
+    cells = pd.Series(data[countries].to_numpy(dtype=object).ravel())
+    current = (cells=='C').to_numpy()
+    parsed = pd.to_datetime(cells.where(~current), format=variables.CELL_DATE_FORMAT, errors='coerce')
+    bulletin = np.repeat(data['date'].to_numpy(), len(countries))
+    values = np.where(current, bulletin, parsed.to_numpy()).reshape(len(data), len(countries))
+    data[countries] = pd.DataFrame(values, index=data.index, columns=countries)
+    return data
+
+def parse_bulletin(url, html, normalize=True):
+    """
+    module-level wrapper around getUrlData so parsing can run in a process pool
+    Output:
+        standardized dataframe, empty if page had no usable tables
+    """
+    return parse_bulletin_timed(url, html, normalize)[0]
+
+def parse_bulletin_timed(url, html, normalize=True):
+    """
+    same as parse_bulletin
+    Output:
+        (dataframe, {stage: seconds}, failure reason or None) for runReport
+    """
+    if html is None: #bulletin unavailable
+        return pd.DataFrame(), {}, None
+    obj = getUrlData(url, html=html, normalize=normalize)
+    return obj.data, obj.timings, obj.error
+
+def publish(store, snapshot=variables.SNAPSHOT, cube=variables.CUBE_DIR, changed=True):
+    """
+    write the prebuilt copies of store the app starts from, the store is only read if one of them is out of date
+    Inputs:
+        snapshot: path of the dataset snapshot, None->don't write one
+        cube: directory of the memory-mapped dataset cube, None->don't write one
+        changed: False->store wasn't modified, only missing copies & a cube of another store or generation are written
+    """
+    generation, build = store.manifest.generation, store.manifest.build
+    snapshot = snapshot if snapshot is not None and (changed or not pathlib.Path(snapshot).is_file()) else None
+    cube = cube if cube is not None and (changed or published_version(cube)!=(build, generation)) else None
+    if snapshot is None and cube is None:
+        return
+    data = store.read() if store.exists() else storage.empty_long()
+    if snapshot is not None:
+        storage.write_snapshot(data, generation, snapshot)
+    if cube is not None:
+        write_cube(data, generation, cube, build=build)
+
+def bounded_results(submit, items, window):
+    """
+    Input:
+        submit: callable(item)->Future or finished result
+        items: iterable, consumed lazily
+        window: results pending ahead of the consumer, 0->each item is submitted when the previous one was consumed
+    Output:
+        generator of (item, result) in item order, memory is bounded by window instead of len(items)
+    """
+    pending = collections.deque()
+    def result(item, value):
+        return item, (value.result() if isinstance(value, Future) else value)
+    for item in items:
+        pending.append((item, submit(item)))
+        while len(pending)>window:
+            yield result(*pending.popleft())
+    while pending:
+        yield result(*pending.popleft())
+
 """
 Class definitions
 """
 
+class IncompleteBuild(Exception):
+    """
+    bulletins couldn't be fetched (download failure, not in the cache offline), raised after the run report is written
+    a full rebuild keeps the previous datalog, an update only appends the bulletins before the first failed one
+    Attributes:
+        report: runReport of the run
+    """
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+class batchWriter():
+    """
+    Collects raw bulletins & adds them to a store sink in batches, each batch is normalized in one pass
+    Inputs:
+        sink: store writer, see storage.bulletinSink
+        report: runReport, normalization & write stages & rows are recorded
+        size: bulletins per batch
+    """
+    def __init__(self, sink, report, size=variables.WRITE_BATCH):
+        self.sink = sink
+        self.report = report
+        self.size = max(size, 1)
+        self.batch = []
+
+    def add(self, data):
+        """
+        queue raw dataframe of one bulletin, empty ones are ignored
+        """
+        if len(data.index)>0:
+            self.batch.append(data)
+        if len(self.batch)>=self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        with self.report.stage('normalization'):
+            data = normalize_frame(pd.concat(self.batch))
+        self.batch = []
+        self.report.count('rows', len(data.index))
+        with self.report.stage('write'):
+            self.sink.add(data)
+
 class validUrl():
     """
     Checks if url is valid, doesn't check if it exists.
@@ -36,6 +226,31 @@ class validUrl():
             return False
         return result
 
+class rateLimiter():
+    """
+    Spaces out requests sent to the same host, safe to share between threads
+    Inputs:
+        rate: max requests per second per host, None or 0 disables limiting
+    """
+    def __init__(self, rate=variables.RATE_LIMIT):
+        self.interval = 1.0/rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = {} #{host: earliest time the next request may start}
+
+    def wait(self, url):
+        """
+        block until a request to the host of url is allowed
+        """
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval #reserve slot before releasing lock
+        if slot>now:
+            time.sleep(slot-now)
+
 class getUrlData():
     """
     example of valid url: 'https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/2021/visa-bulletin-for-january-2021.html'
@@ -44,9 +259,21 @@ class getUrlData():
     2. 2 employment based tables
     3. add month, year to tables
     4. store both tables
+    Inputs:
+        valid_url: bulletin url
+        html: raw page content, if None page is downloaded from valid_url
+        normalize: False->keep raw cell strings, caller runs normalize_frame over many bulletins at once
+    Attributes besides data:
+        timings: {stage: seconds} for fetch, table_detection, combine_tables, column_operations,
+            normalization (only if normalize)
+        error: reason data is empty, None if tables were found
     """
-    def __init__(self, valid_url):
+    def __init__(self, valid_url, html=None, normalize=True):
         self.valid_url = valid_url
+        self.html = html
+        self.normalize = normalize
+        self.timings = {}
+        self.error = None
         self.get_date()
         self.get_tables()
 
@@ -64,30 +291,46 @@ class getUrlData():
     def get_tables(self):
         #extract employment tables from url
         try:
-            tables = pd.read_html(self.valid_url)
+            if self.html is None:
+                with timed(self.timings, 'fetch'):
+                    self.html = get_session().get(self.valid_url).text
+            with timed(self.timings, 'table_detection'):
+                tables = extract_employment_tables(self.html)
             self.check_tables(tables)
         except Exception as e:
-            print(f"Exception during pd.read_html {e}")
+            print(f"Exception during table extraction {e}")
             print(f"url: {self.valid_url}")
+            self.error = f"table extraction: {e}"
             self.data = pd.DataFrame()
 
-    def check_tables(self, tables):
+    def check_tables(self, employment_tables):
         """
         check for employment tables
-        Post 2010 urls expect exactly 2 tables meeting criterion
+        Post 2010 urls expect exactly 2 tables meeting criterion (final & filing)
         """
-        employment_tables = [x for x in tables if len(x)==9] #employment tables have len=9
         if len(employment_tables)==2:
-            try:
+            self.process_tables(employment_tables)
+        else:
+            self.error = f"found {len(employment_tables)} employment tables, expected 2"
+            self.data = pd.DataFrame()
+
+    def process_tables(self, employment_tables):
+        """
+        combine & standardize employment tables into data attribute, final action table first
+        """
+        try:
+            with timed(self.timings, 'combine_tables'):
                 self.combine_tables(employment_tables) #combine tables into data attribute
+            with timed(self.timings, 'column_operations'):
                 self.data_column_operations()
-                self.data_row_operations()
-            except Exception as e:
-                #if ANY error occurs during table processing
-                print(f"Exception during table processing {e}")
-                print(f"url: {self.valid_url}")
-                self.data = pd.DataFrame()
-        else:
+            if self.normalize: #else normalized per batch, see batchWriter
+                with timed(self.timings, 'normalization'):
+                    self.data_row_operations()
+        except Exception as e:
+            #if ANY error occurs during table processing
+            print(f"Exception during table processing {e}")
+            print(f"url: {self.valid_url}")
+            self.error = f"table processing: {e}"
             self.data = pd.DataFrame()
 
     def combine_tables(self, employment_tables):
@@ -132,58 +375,26 @@ class getUrlData():
         1. add bulletin date as column
         """
         #1. add bulletin date as column
-        self.data['date'] = '-'.join([self.year, str(variables.MONTH_DICT_REV[self.month]), '1'])#add bulletin release date as column (YYYY-MM-DD format)
+        self.data['date'] = pd.Timestamp(year=int(self.year), month=variables.MONTH_DICT_REV[self.month], day=1) #bulletin release date
 
     def data_row_operations(self):
         """
-        Modify data rows in place
-        1. U->np.nan
-        2. clean up EBn column values
-        3. C->bulletin date, swap out dates
+        Modify data rows, see normalize_frame
         """
-        #1. U->np.nan
-        self.data.replace(to_replace='U', value=np.nan, inplace=True)
-
-        #2. clean up EBn column values
-        def categories(x):
-            """
-            Define how to modify cell value
-            """
-            if any(s in x for s in ['I5', 'R5']):
-                return '5th regional'
-            elif any(s in x for s in ['C5', 'T5']):
-                return '5th non-regional'
-            elif any(s in x for s in ['Certain', 'Religious']):
-                return 'Religious Workers'
-            else:
-                return x
-        self.data['EBn'] = self.data['EBn'].apply(lambda x: categories(x))
-
-        #3. C->bulletin date, swap out dates
-        month_abbr_dict = {k[0:3].upper():str(v) for k,v in variables.MONTH_DICT_REV.items()}
-        def swap_dates(x):
-            if x!=x: #math.isnan(x) throws TypeError: must be real number, not str
-                return x #return np.nan as is
-            elif re.match(r"^\d{2}[A-Z]{3}\d{2}", x): #match date format from url
-                day, month, year = x[0:2], x[2:5], x[5:]
-                x = '-'.join(['20'+year, month_abbr_dict[month], day])
-
-            return x #returns swapped date or previously filled in date (the C's)
-        countries = list(set(self.data.columns) - set(['EBn', 'state', 'date']))
-        for country in countries:
-            self.data[country] = np.where(self.data[country]=='C', self.data['date'], self.data[country])
-            self.data[country] = self.data[country].apply(lambda x: swap_dates(x))
+        self.data = normalize_frame(self.data)
         
 class urlGen():
     """
-    Generates list of valid urls
+    Generates valid urls lazily, one per month
     Inputs:
         start & end dates as datetime objects
+        base_url: scheme & host of generated urls, e.g. a local stand-in server
+    Iterating yields (url, bulletin month) pairs, url_list & dates build the full lists
     """
-    def __init__(self, start_dt=datetime(2010,1,1), end_dt=datetime.now()):
+    def __init__(self, start_dt=datetime(2010,1,1), end_dt=datetime.now(), base_url=variables.BULLETIN_BASE_URL):
         self.start_dt = start_dt
         self.end_dt = end_dt
-        self.url_list = self.generate_list()
+        self.base_url = urlparse(base_url)
 
     def build_path(self, month, year):
         #both month & year come in as ints
@@ -195,94 +406,285 @@ class urlGen():
         fiscal_year = year+1 if month>=10 else year #fiscal year starts in October
         return prefix + str(fiscal_year) + page
 
-    def generate_list(self):
-        url_list = []
-
+    def __iter__(self):
         #generate month, year from 2010 to now: https://stackoverflow.com/a/155172
         for dt in rrule(freq=MONTHLY, dtstart=self.start_dt, until=self.end_dt):
             month = dt.month #int  #get month as string
             year = dt.year #int
 
             #https://stackoverflow.com/a/53993037
-            url_obj = ParseResult(scheme='https',
-                                    netloc='travel.state.gov',
+            url_obj = ParseResult(scheme=self.base_url.scheme,
+                                    netloc=self.base_url.netloc,
                                     path=self.build_path(month, year),
                                     params='', query='', fragment='')
-            url_list.append(urlunparse(url_obj))
-        return url_list
+            yield urlunparse(url_obj), dt
+
+    @property
+    def url_list(self):
+        return [url for url, dt in self]
+
+    @property
+    def dates(self):
+        return [dt for url, dt in self]
+
+    def is_valid(self):
+        """
+        Output:
+            True if there are urls & they are valid
+        every url shares scheme & host & has a path from build_path, so only the first one is validated
+        """
+        first = next(iter(self), None)
+        return first is not None and bool(validUrl(first[0]).is_valid_url())
 
 class buildDatabase():
     """
-    Write to ~/data/datalog.csv
+    Write to datalog store, ~/data/datalog/ (parquet) or ~/data/datalog.csv (see tools.storage)
     Inputs:
         start_dt, end_dt: start & end datetime object
         all: 
-            True->delete datalog if exists, download all data and save to datalog
+            True->rebuild datalog, download all data from start to end and save to datalog
+                (bulletins outside that range, e.g. pdf backfills, are carried over)
             False->check for datalog:
                 IF doesn't exist, switch to all=True mode
                 ELSE, download & save latest data
+        workers: number of bulletins downloaded concurrently, 1->serial
+        rate: max requests per second per host
+        offline: True->build only from pages in the html cache, no network I/O
+        cache: htmlCache instance, default cache directory if None
+        parse_workers: number of processes parsing downloaded pages, 1->parse in this process
+        store: storage backend instance, storage.get_store() if None
+        snapshot: path of the app's prebuilt dataset snapshot, None->don't write one
+        cube: directory of the memory-mapped dataset cube the app's workers share, None->don't write one
+        base_url: scheme & host bulletins are downloaded from
+        start, end: datetime range of bulletins for a full build, end=None->now
+        report_path: run report json (stage timings, slowest bulletins, failures), None->don't write
+        prometheus_path: same report in Prometheus text format, None->don't write
+        resume: True->checkpoint every parsed bulletin to checkpoint_dir & skip bulletins an
+            interrupted run already finished, checkpoint is removed once the datalog is written
+        checkpoint_dir: directory of the backfill journal
+        derived: path of the derived metrics table, updated with new bulletins, None->don't maintain one
+        batch: bulletins normalized & written to the store together
+    Attributes:
+        report: runReport of this run
+        unfetched: urls that failed to download, IncompleteBuild is raised if there are any
+            full rebuild->previous datalog is kept, update->stops appending at the first one
     """
-    def __init__(self, all=True):
+    def __init__(self, all=True, workers=variables.FETCH_WORKERS, rate=variables.RATE_LIMIT,
+                    offline=False, cache=None, parse_workers=variables.PARSE_WORKERS, store=None,
+                    snapshot=variables.SNAPSHOT, cube=variables.CUBE_DIR, base_url=variables.BULLETIN_BASE_URL,
+                    start=variables.START_DATE, end=None,
+                    report_path=variables.RUN_REPORT, prometheus_path=None,
+                    resume=False, checkpoint_dir=variables.CHECKPOINT_DIR, derived=variables.DERIVED,
+                    batch=variables.WRITE_BATCH):
         self.all = all
+        self.journal = backfillJournal(checkpoint_dir) if resume else None
+        self.report = runReport()
+        self.report_path = report_path
+        self.prometheus_path = prometheus_path
+        self.start = start
+        self.end = end
+        self.base_url = base_url
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.limiter = rateLimiter(rate)
+        self.offline = offline
+        self.cache = cache if cache is not None else htmlCache()
+        self.store = store if store is not None else storage.get_store()
+        self.snapshot = snapshot
+        self.cube = cube
+        self.derived = derived
+        self.batch = max(batch, 1)
+        self.probe = set() #urls checked with HEAD before downloading
+        self.unfetched = [] #urls that failed to download (not missing), in bulletin order
         self.router()
 
     def router(self):
         """
         routes control flow based on value of self.all
+        bulletins stream from the fetchers into a store writer one at a time, see get_url_data
         """
-        if self.all:
-            variables.DATALOG.unlink(missing_ok=True) #delete file, will be replaces
-            #build url_list
-            data = self.get_url_data() #use defaults
-            data.to_csv(variables.DATALOG, index=None)
-        else: #user wants to update datalog
-            if not variables.DATALOG.is_file(): #datalog doesn't exist
-                #build url_list
-                data = self.get_url_data()
-                data.to_csv(variables.DATALOG, index=None)
-            else: #datalog exists
-                old_data = pd.read_csv(variables.DATALOG)
-
+        replace, start = True, self.start
+        self.store.recover() #finish an interrupted rewrite before looking at the datalog
+        if not self.all: #user wants to update datalog
+            legacy = storage.csvStore()
+            if not self.store.exists() and isinstance(self.store, storage.parquetStore) and legacy.exists():
+                self.store.write(legacy.read_wide()) #one-time import of legacy csv datalog
+
+            if self.store.exists(): #datalog exists, else full build
                 #find start date
-                old_data['date'] = pd.to_datetime(old_data['date'])
-                latest_date = old_data['date'].max() #pandas.Timestamp object
-                # (year, month, day) = [int(x) for x in latest_date.split('-')]
+                latest_date = self.store.latest_date() #pandas.Timestamp object
                 (year, month, day) = latest_date.year, latest_date.month, latest_date.day 
 
                 start = datetime(year=year+int(month/12),
                                     month=(month%12)+1, day=1)
                 print(latest_date, start)
-                
-                #build url_list
-                data = self.get_url_data(start=start)
-                variables.DATALOG.unlink(missing_ok=True) #delete file, will be replaces
-                pd.concat([old_data, data]).to_csv(variables.DATALOG, index=None)
+                replace = False
 
-    def get_url_data(self, start=variables.START_DATE, end=datetime.now()):
+        try:
+            with self.store.writer(replace=replace) as sink:
+                if replace:
+                    self.carry_over(sink, start, self.end)
+                self.get_url_data(sink, start=start, end=self.end)
+                #a replacement missing bulletins would delete them, abort it & keep the previous datalog
+                if replace and self.unfetched:
+                    raise IncompleteBuild("{} bulletins couldn't be fetched, first {}, kept the previous datalog".format(
+                                            len(self.unfetched), self.unfetched[0]), self.report)
+                if replace and not sink.bulletins:
+                    raise IncompleteBuild("no bulletins were written, kept the previous datalog", self.report)
+        except IncompleteBuild:
+            if self.report_path is not None:
+                self.report.write(self.report_path, self.prometheus_path)
+            raise
+
+        #derived metrics, incremental when bulletins were appended
+        if self.derived is not None:
+            with self.report.stage('derived'):
+                table = derivedTable(self.derived)
+                if replace:
+                    table.rebuild(self.store)
+                else:
+                    new = self.store.read(start=min(sink.bulletins)) if sink.bulletins else storage.empty_long()
+                    table.update(new, self.store)
+
+        if self.journal is not None and not self.unfetched: #results are in the datalog now
+            self.journal.clear()
+
+        #prebuilt copies for fast app startup, a poll without new bulletins leaves them (& the app's caches) alone
+        publish(self.store, self.snapshot, self.cube, changed=replace or bool(sink.bulletins))
+
+        if self.report_path is not None:
+            self.report.write(self.report_path, self.prometheus_path)
+        if self.unfetched:
+            raise IncompleteBuild("{} couldn't be fetched, appended the bulletins before it, the next run starts there".format(
+                                    self.unfetched[0]), self.report)
+
+    def carry_over(self, sink, start, end=None):
+        """
+        copy bulletins of the current datalog outside the rebuilt months (e.g. pdf backfills, see tools.pdf)
+        into a replacement, so a full rebuild doesn't delete them
+        """
+        if not self.store.exists():
+            return
+        self.store.check_manifest()
+        first = start.strftime('%Y-%m-01')
+        last = (end if end is not None else datetime.now()).strftime('%Y-%m-%d')
+        keep = [date for date in self.store.manifest.bulletins if date<first or date>last]
+        with self.report.stage('carry_over'):
+            for data in self.store.read_bulletins(keep, self.batch):
+                sink.add(data)
+        self.report.count('bulletins_carried', len(keep))
+
+    def get_url_data(self, sink, start=variables.START_DATE, end=None):
         """
         Input:
-            start & end datetime objects
-        Output:
-            dataframe object
+            sink: store writer (see storage.bulletinSink) every bulletin is added to as soon as it is parsed
+            start & end datetime objects, end=None->now
+        Bulletins are normalized & written in batches of self.batch as they arrive,
+        memory doesn't grow with the number of bulletins
         """
-        data = pd.DataFrame()
+        end = end if end is not None else datetime.now()
 
-        gen = urlGen(start_dt=start, end_dt=end)
+        with self.report.stage('url_generation'):
+            gen = urlGen(start_dt=start, end_dt=end, base_url=self.base_url)
         """
         note: start date is calculated as (latest_month in DATALOG) + 1, 
         so if user uses self.all=True when (latest_month in DATALOG) == current month, rrule will not iterate in urlGen
         """
-        if len(gen.url_list)>0:
-            table_list = []
-            for url in gen.url_list:
-                if validUrl(url).is_valid_url(): #validate url
-                    data_object = getUrlData(url)
-                    table_list.append(data_object.data)
-
-            #concat data object from all urls
-            data = pd.concat(table_list)
-        return data
-
+        with self.report.stage('validation'):
+            valid = gen.is_valid()
+        if not valid:
+            return
+
+        #latest bulletins may not be published yet, a HEAD request tells without downloading
+        recent = datetime.now() - relativedelta(months=variables.PROBE_MONTHS)
+        def requested():
+            for url, dt in gen:
+                self.report.count('bulletins_requested')
+                if dt>recent:
+                    self.probe.add(url)
+                yield url
+
+        session = self.cache.session or get_session()
+        retried = session.retried
+        try:
+            writer = batchWriter(sink, self.report, self.batch)
+            with contextlib.closing(self.fetch_all(requested())) as results:
+                for url, data in results:
+                    if data is None: #couldn't be fetched, may succeed on a later run
+                        self.unfetched.append(url)
+                        if not sink.replace:
+                            break #appending later months would move latest_date past the hole
+                        continue
+                    writer.add(data)
+            writer.flush()
+        finally:
+            self.report.count('http_retries', session.retried-retried)
+
+    def fetch_all(self, urls):
+        """
+        Input:
+            urls: iterable of valid urls, consumed lazily
+        Output:
+            generator of (url, raw dataframe), in the same order as urls
+            dataframe is empty for unpublished or unparsable bulletins, None if the download failed
+        Each bulletin is downloaded, parsed & (in resume mode) checkpointed as soon as it arrives,
+        bulletins finished by an interrupted run are loaded from the checkpoint instead
+        At most 2*workers downloads are in flight ahead of the consumer, so pending results stay bounded
+        """
+        #parsing is cpu bound, optionally in a process pool fed by the download threads
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers>1 else None
+        executor = ThreadPoolExecutor(max_workers=self.workers) if self.workers>1 else None
+        window = 2*self.workers if executor is not None else 0
+
+        def fetch(url):
+            if not self.offline and not self.cache.known_missing(url):
+                self.limiter.wait(url)
+            with self.report.stage('fetch', url):
+                html = self.cache.get(url, offline=self.offline, probe=url in self.probe)
+            if html is None:
+                self.report.failure(url, self.cache.failures.get(url, 'unavailable'))
+            else:
+                how, received = self.cache.outcomes.get(url, ('cache', 0))
+                if how=='download': #network bytes only, cached pages cost no transfer
+                    self.report.count('bulletins_fetched')
+                    self.report.count('bytes_fetched', received)
+                    self.report.record(url, bytes=received)
+                elif how=='not_modified':
+                    self.report.count('not_modified')
+                else:
+                    self.report.count('cache_hits')
+            return html
+
+        def process(url):
+            html = fetch(url)
+            if html is None:
+                return pd.DataFrame() if self.cache.known_missing(url) else None #unpublished vs failed download
+            if parse_pool is not None:
+                data, timings, error = parse_pool.submit(parse_bulletin_timed, url, html, False).result()
+            else:
+                data, timings, error = parse_bulletin_timed(url, html, False) #normalized by the consumer
+            self.report.add_timings(timings, url) #measured in the parsing process
+            if error is None:
+                self.report.count('bulletins_parsed')
+                self.report.record(url, rows=len(data.index))
+                if self.journal is not None:
+                    self.journal.save(url, data)
+            else:
+                self.report.failure(url, error)
+            return data
 
+        def submit(url):
+            data = self.journal.load(url) if self.journal is not None else None
+            if data is not None:
+                self.report.count('bulletins_resumed')
+                return data
+            return executor.submit(process, url) if executor is not None else process(url)
 
-    
\ No newline at end of file
+        try:
+            yield from bounded_results(submit, urls, window)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.cache.flush()
+            if parse_pool is not None:
+                parse_pool.shutdown()
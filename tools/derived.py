@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+
+#file manipulation
+import os
+import pathlib
+
+#import global variables
+import tools.variables as variables
+import tools.storage as storage
+
+SERIES = ['country', 'EBn', 'state']
+DAY = np.timedelta64(1, 'D')
+
+"""
+Function definitions
+"""
+
+def derive(data, previous=None):
+    """
+    Input:
+        data: typed long dataframe
+        previous: derived rows holding the latest bulletin of each series before data, None->data starts every series
+    Output:
+        derived dataframe, data's rows sorted by series & bulletin date with columns
+        movement_days: cutoff change since the previous bulletin of the series, NaN if either cutoff is unavailable
+        retrogressed: cutoff moved back
+        current: cutoff is the bulletin date (C)
+        gap_days: bulletin date - cutoff, 0 when current
+    """
+    data = data[['EBn', 'state', 'date', 'country', 'priority']]
+    if previous is not None and len(previous.index)>0:
+        data = pd.concat([previous[data.columns].assign(_previous=True), data.assign(_previous=False)])
+    else:
+        data = data.assign(_previous=False)
+    data = storage.typed(data.sort_values(SERIES + ['date'], kind='mergesort').reset_index(drop=True))
+
+    last = data.groupby(SERIES, observed=True, sort=False)['priority'].shift()
+    data['movement_days'] = (data['priority'] - last) / DAY
+    data['retrogressed'] = (data['movement_days']<0).to_numpy()
+    data['current'] = (data['priority']==data['date']).to_numpy()
+    data['gap_days'] = (data['date'] - data['priority']) / DAY
+    return data.loc[~data.pop('_previous').to_numpy(dtype=bool)].reset_index(drop=True)
+
+def empty_derived():
+    return derive(storage.empty_long())
+
+"""
+Class definitions
+"""
+
+class derivedTable():
+    """
+    Materialized per-series metrics (see derive) kept next to the datalog
+    New bulletins are derived from their own rows & the latest row of each series, the table is
+    only recomputed in full when it doesn't cover the store's bulletins (missing, or bulletins added out of order)
+    Pickled with the bulletin dates it covers, via temporary file & rename
+    Inputs:
+        path: pickle file
+    """
+    def __init__(self, path=variables.DERIVED):
+        self.path = pathlib.Path(path)
+        self.load()
+
+    def load(self):
+        try:
+            content = pd.read_pickle(self.path)
+            self.data, self.bulletins = content['data'], set(content['bulletins'])
+        except Exception:
+            self.data, self.bulletins = empty_derived(), set()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        pd.to_pickle({'bulletins': sorted(self.bulletins), 'data': self.data}, tmp)
+        os.replace(tmp, self.path)
+
+    def read(self, countries=None, states=None, ebns=None, start=None, end=None):
+        """
+        Output:
+            derived dataframe, filtered like the store's read
+        """
+        return storage.filter_long(self.data, countries, states, ebns, start, end)
+
+    def rebuild(self, store):
+        """
+        recompute the table from every bulletin in store
+        """
+        data = store.read() if store.exists() else storage.empty_long()
+        self.data = derive(data)
+        self.bulletins = set(storage.bulletin_dates(data))
+        self.save()
+
+    def update(self, data, store):
+        """
+        Input:
+            data: typed long dataframe of bulletins just appended to store
+            store: storage backend, read in full only if the table is out of sync
+        """
+        store.check_manifest()
+        new = set(storage.bulletin_dates(data)) - self.bulletins
+        if self.bulletins!=store.manifest.bulletins-new or (new and self.bulletins and min(new)<=max(self.bulletins)):
+            return self.rebuild(store)
+        if not new:
+            return
+
+        data = data.loc[pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').isin(new).to_numpy()]
+        previous = self.data.sort_values('date', kind='mergesort').groupby(SERIES, observed=True).tail(1)
+        self.data = pd.concat([self.data, derive(data, previous)], ignore_index=True)
+        self.data = storage.typed(self.data.sort_values(SERIES + ['date'], kind='mergesort').reset_index(drop=True))
+        self.bulletins |= new
+        self.save()
@@ -0,0 +1,136 @@
+import json
+import os
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+
+"""
+Function definitions
+"""
+
+@contextmanager
+def timed(timings, name):
+    """
+    add seconds spent in the block to timings[name]
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+"""
+Class definitions
+"""
+
+class runReport():
+    """
+    Thread-safe stage timings, counters & per-bulletin records for one ingestion run
+    Stages: url_generation, validation, fetch, table_detection, combine_tables, column_operations (per bulletin),
+    normalization (per write batch), write
+    Page counters: bulletins_fetched & bytes_fetched (network downloads), not_modified (304 revalidations),
+    cache_hits (answered from the html cache without a transfer)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {} #{stage: {'count', 'seconds', 'max_seconds'}}
+        self.counters = {}
+        self.bulletins = {} #{url: {'<stage>_s': seconds, 'bytes', 'rows', 'error'}}
+
+    def add_stage(self, name, seconds, url=None):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            stage['max_seconds'] = max(stage['max_seconds'], seconds)
+            if url is not None:
+                record = self.bulletins.setdefault(url, {})
+                record[name + '_s'] = record.get(name + '_s', 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name, url=None):
+        """
+        time the block as one call of stage name, attributed to url if given
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start, url)
+
+    def add_timings(self, timings, url=None):
+        """
+        merge {stage: seconds} measured elsewhere, e.g. in a parse worker process
+        """
+        for name, seconds in timings.items():
+            self.add_stage(name, seconds, url)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, url, **fields):
+        with self.lock:
+            self.bulletins.setdefault(url, {}).update(fields)
+
+    def failure(self, url, reason):
+        self.count('bulletins_failed')
+        self.record(url, error=reason)
+
+    def to_dict(self, slowest=10):
+        """
+        Output:
+            report as dict: stage totals, counters, slowest bulletins & failure reasons per url
+        """
+        with self.lock:
+            totals = {url: sum(v for k, v in record.items() if k.endswith('_s'))
+                        for url, record in self.bulletins.items()}
+            ranked = sorted(totals, key=totals.get, reverse=True)[:slowest]
+            return {
+                'started': self.started,
+                'seconds': time.time() - self.started,
+                'stages': {k: dict(v) for k, v in self.stages.items()},
+                'counters': dict(self.counters),
+                'slowest_bulletins': [dict(self.bulletins[url], url=url, total_s=totals[url]) for url in ranked],
+                'failures': {url: record['error'] for url, record in self.bulletins.items() if record.get('error')},
+            }
+
+    def to_prometheus(self, prefix='visa_bulletin_ingest'):
+        """
+        Output:
+            report in Prometheus text exposition format
+        """
+        report = self.to_dict()
+        lines = [
+            '# TYPE {}_stage_seconds_total counter'.format(prefix),
+        ]
+        for name, stage in sorted(report['stages'].items()):
+            lines.append('{}_stage_seconds_total{{stage="{}"}} {}'.format(prefix, name, stage['seconds']))
+        lines.append('# TYPE {}_stage_calls_total counter'.format(prefix))
+        for name, stage in sorted(report['stages'].items()):
+            lines.append('{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, name, stage['count']))
+        lines.append('# TYPE {}_stage_max_seconds gauge'.format(prefix))
+        for name, stage in sorted(report['stages'].items()):
+            lines.append('{}_stage_max_seconds{{stage="{}"}} {}'.format(prefix, name, stage['max_seconds']))
+        for name, value in sorted(report['counters'].items()):
+            lines.append('# TYPE {}_{} counter'.format(prefix, name))
+            lines.append('{}_{} {}'.format(prefix, name, value))
+        lines.append('# TYPE {}_run_seconds gauge'.format(prefix))
+        lines.append('{}_run_seconds {}'.format(prefix, report['seconds']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, prometheus_path=None):
+        """
+        write json report (and optional Prometheus text file), each via temporary file & rename
+        """
+        outputs = [(path, lambda: json.dumps(self.to_dict(), indent=2))]
+        if prometheus_path is not None:
+            outputs.append((prometheus_path, self.to_prometheus))
+        for target, render in outputs:
+            target = pathlib.Path(target)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + '.tmp')
+            tmp.write_text(render())
+            os.replace(tmp, target)
@@ -0,0 +1,251 @@
+"""
+Ingestion of printed (pdf) visa bulletins, the format of the pre-2010 archive
+Usage:
+    python -m tools.pdf bulletins/ visabulletin_January2009.pdf https://.../visa-bulletin-for-may-2008.pdf [--workers 8]
+Directories are searched for *.pdf, the bulletin month is read from each file name
+"""
+import argparse
+import contextlib
+import io
+import os
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import regex as re
+
+try: #optional, only needed to parse pdf bulletins
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+#import global variables
+import tools.variables as variables
+import tools.storage as storage
+
+from tools.data import batchWriter, bounded_results, getUrlData, publish
+from tools.derived import derivedTable
+from tools.instrument import runReport, timed
+from tools.session import get_session
+
+#<month><separator?><year>.pdf, e.g. visa-bulletin-for-january-2009.pdf or visabulletin_January2009.pdf
+NAME_PATTERN = re.compile(r'([A-Za-z]+)[-_ ]?(\d{4})\.pdf$')
+
+"""
+Function definitions
+"""
+
+def bulletin_month(source):
+    """
+    Input:
+        source: pdf file path or url
+    Output:
+        (month name, year) as lowercase string & int, None if the name doesn't hold a bulletin month
+    """
+    for match in NAME_PATTERN.finditer(pathlib.PurePosixPath(str(source).split('?')[0]).name):
+        if match.group(1).lower() in variables.MONTH_DICT_REV:
+            return match.group(1).lower(), int(match.group(2))
+    return None
+
+def read_source(source):
+    """
+    Output:
+        pdf bytes of a local file or url
+    """
+    if str(source).startswith(('http://', 'https://')):
+        return get_session().get(str(source)).content
+    return pathlib.Path(source).read_bytes()
+
+def is_employment_header(header):
+    return all(any(s in header for s in group) for group in variables.EMPLOYMENT_FINGERPRINTS)
+
+def extract_pdf_tables(content):
+    """
+    Input:
+        content: pdf bytes
+    Output:
+        list of dataframes, one per employment-based table in page order,
+        first row holds the raw column names (same layout extract_employment_tables returns)
+    A table cut by a page break continues at the top of the next page without a header row,
+    those rows are joined to the table they continue
+    """
+    if pdfplumber is None:
+        raise ImportError("pdf bulletins require pdfplumber")
+    tables = []
+    open_table = None #employment table ending the previous page
+    with pdfplumber.open(io.BytesIO(content)) as pdf:
+        for page in pdf.pages:
+            last = None
+            for idx, table in enumerate(page.extract_tables()):
+                rows = [[' '.join((cell or '').split()) for cell in row] for row in table]
+                last = None
+                if rows and is_employment_header(' '.join(rows[0])):
+                    tables.append(rows)
+                    last = rows
+                elif rows and idx==0 and open_table is not None and len(rows[0])==len(open_table[0]): #continued
+                    open_table.extend(rows)
+                    last = open_table
+            open_table = last
+    return [pd.DataFrame(rows) for rows in tables]
+
+def parse_pdf(source, normalize=False):
+    """
+    module-level wrapper around getPdfData so parsing can run in a process pool
+    Output:
+        (dataframe, {stage: seconds}, failure reason or None) for runReport
+    """
+    obj = getPdfData(source, normalize=normalize)
+    return obj.data, obj.timings, obj.error
+
+"""
+Class definitions
+"""
+
+class getPdfData(getUrlData):
+    """
+    getUrlData for a printed bulletin, same output schema as html bulletins
+    Bulletins printed before October 2015 only have the final action table, so 1 or 2 employment tables are expected
+    Inputs:
+        source: pdf file path or url, its name holds the bulletin month
+        content: pdf bytes, if None source is read
+        normalize: see getUrlData
+    """
+    def __init__(self, source, content=None, normalize=True):
+        super().__init__(str(source), html=content, normalize=normalize)
+
+    def get_date(self):
+        """
+        extract & assign month & year attributes from the file name
+        """
+        month = bulletin_month(self.valid_url)
+        if month is None:
+            raise ValueError("no bulletin month in {}".format(self.valid_url))
+        self.month, self.year = month[0], str(month[1])
+
+    def get_tables(self):
+        #extract employment tables from pdf
+        try:
+            if self.html is None:
+                with timed(self.timings, 'fetch'):
+                    self.html = read_source(self.valid_url)
+            with timed(self.timings, 'table_detection'):
+                tables = extract_pdf_tables(self.html)
+            self.check_tables(tables)
+        except Exception as e:
+            print(f"Exception during table extraction {e}")
+            print(f"source: {self.valid_url}")
+            self.error = f"table extraction: {e}"
+            self.data = pd.DataFrame()
+
+    def check_tables(self, employment_tables):
+        """
+        check for employment tables, final action & optionally dates for filing
+        """
+        if len(employment_tables) in [1, 2]:
+            self.process_tables(employment_tables)
+        else:
+            self.error = f"found {len(employment_tables)} employment tables, expected 1 or 2"
+            self.data = pd.DataFrame()
+
+class pdfBackfill():
+    """
+    Add pdf bulletins to the datalog store, parsing them in a process pool
+    Table extraction from pdf is cpu bound, so every core parses a bulletin while this process
+    normalizes & writes finished ones in batches, bulletins already in the store are skipped
+    Inputs:
+        sources: pdf file paths, urls or directories holding *.pdf
+        workers: parsing processes, None->one per cpu
+        store: storage backend instance, storage.get_store() if None
+        derived, snapshot, cube: see buildDatabase, rebuilt when bulletins were added
+        batch: bulletins normalized & written to the store together
+        report_path: run report json, None->don't write
+    Attributes:
+        report: runReport of this run
+    """
+    def __init__(self, sources, workers=variables.PDF_WORKERS, store=None, derived=variables.DERIVED,
+                    snapshot=variables.SNAPSHOT, cube=variables.CUBE_DIR, batch=variables.WRITE_BATCH, report_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.store = store if store is not None else storage.get_store()
+        self.batch = max(batch, 1)
+        self.report = runReport()
+
+        self.store.recover() #finish an interrupted rewrite before comparing against the manifest
+        with self.report.stage('url_generation'):
+            todo = self.select(sources)
+        if todo:
+            with self.store.writer() as sink:
+                self.ingest(todo, sink)
+            if sink.bulletins:
+                if derived is not None:
+                    with self.report.stage('derived'):
+                        derivedTable(derived).rebuild(self.store)
+                publish(self.store, snapshot, cube)
+
+        if report_path is not None:
+            self.report.write(report_path)
+
+    def select(self, sources):
+        """
+        Output:
+            pdf sources to parse in bulletin order, without bulletins the store already has
+        """
+        found = []
+        for source in sources:
+            path = pathlib.Path(source)
+            if not str(source).startswith(('http://', 'https://')) and path.is_dir():
+                found += sorted(path.glob('*.pdf'))
+            else:
+                found.append(source)
+
+        if self.store.exists():
+            self.store.check_manifest()
+        todo = {}
+        for source in found:
+            self.report.count('bulletins_requested')
+            month = bulletin_month(source)
+            if month is None:
+                self.report.failure(str(source), 'no bulletin month in name')
+                continue
+            date = datetime(month[1], variables.MONTH_DICT_REV[month[0]], 1)
+            if date.strftime('%Y-%m-%d') in self.store.manifest.bulletins or date in todo:
+                self.report.count('bulletins_skipped')
+                continue
+            todo[date] = str(source)
+        return [todo[date] for date in sorted(todo)]
+
+    def ingest(self, sources, sink):
+        """
+        parse sources in the process pool & add them to sink in batches
+        at most 2*workers bulletins are pending ahead of the writer, so finished results stay bounded
+        """
+        writer = batchWriter(sink, self.report, self.batch)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = bounded_results(lambda source: pool.submit(parse_pdf, source), sources, 2*self.workers)
+            with contextlib.closing(results):
+                for source, (data, timings, error) in results:
+                    self.report.add_timings(timings, source) #measured in the parsing process
+                    if error is None:
+                        self.report.count('bulletins_parsed')
+                        self.report.record(source, rows=len(data.index))
+                        writer.add(data)
+                    else:
+                        self.report.failure(source, error)
+        writer.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Add pdf visa bulletins to the datalog")
+    parser.add_argument('sources', nargs='+', help="pdf files, urls or directories of pdf files")
+    parser.add_argument('-w', '--workers', type=int, default=variables.PDF_WORKERS, help="parsing processes, default one per cpu")
+    parser.add_argument('-r', '--report', help="write run report json here")
+    args = parser.parse_args()
+
+    backfill = pdfBackfill(args.sources, workers=args.workers, report_path=args.report)
+    counters = backfill.report.counters
+    print("parsed {} of {} pdf bulletins, {} already ingested, {} failed".format(
+            counters.get('bulletins_parsed', 0), counters.get('bulletins_requested', 0),
+            counters.get('bulletins_skipped', 0), counters.get('bulletins_failed', 0)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
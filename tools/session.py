@@ -0,0 +1,124 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+import random
+import threading
+import time
+
+#import global variables
+import tools.variables as variables
+
+#responses worth retrying
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+MISSING_STATUS = {404, 410}
+#request errors a retry can't fix, every other requests.RequestException (dropped connection, timeout, truncated body) is retried
+FATAL_ERRORS = (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema,
+                requests.exceptions.InvalidHeader, requests.exceptions.URLRequired, requests.exceptions.TooManyRedirects)
+
+"""
+Exception definitions
+"""
+
+class FetchError(Exception):
+    """
+    bulletin could not be downloaded
+    """
+
+class BulletinMissing(FetchError):
+    """
+    page does not exist (not published yet, or never), not retried
+    """
+
+class TransientFetchError(FetchError):
+    """
+    connection error, timeout, broken body or 429/5xx that persisted through every retry
+    """
+
+"""
+Function definitions
+"""
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Output:
+        process-wide fetchSession, created on first use
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = fetchSession()
+        return _session
+
+"""
+Class definitions
+"""
+
+class fetchSession():
+    """
+    Pooled http session shared by the download threads
+    Keeps TLS connections alive between bulletins, applies timeouts & retries transient
+    failures with exponential backoff & full jitter
+    Inputs:
+        pool_size: pooled connections per host
+        timeout: (connect, read) seconds
+        retries: retries after the first attempt
+        backoff, max_backoff: retry n sleeps uniform(0, min(max_backoff, backoff*2**n)) seconds
+    """
+    def __init__(self, pool_size=variables.HTTP_POOL_SIZE, timeout=(variables.CONNECT_TIMEOUT, variables.FETCH_TIMEOUT),
+                    retries=variables.HTTP_RETRIES, backoff=variables.HTTP_BACKOFF, max_backoff=variables.HTTP_MAX_BACKOFF):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0) #retries handled below
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.retried = 0 #total retries, for run reports
+
+    def sleep(self, attempt):
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff*2**attempt)))
+
+    def request(self, method, url, headers=None):
+        """
+        Output:
+            response with status 2xx or 304
+        Raises:
+            BulletinMissing: 404/410
+            TransientFetchError: retries exhausted
+            FetchError: any other status or a request that can't succeed (see FATAL_ERRORS)
+        """
+        for attempt in range(self.retries+1):
+            if attempt>0:
+                with self.lock:
+                    self.retried += 1
+                self.sleep(attempt-1)
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout)
+            except FATAL_ERRORS as e:
+                raise FetchError(f"{type(e).__name__}: {e}")
+            except requests.RequestException as e:
+                reason = f"{type(e).__name__}: {e}"
+                continue
+
+            if response.status_code in MISSING_STATUS:
+                response.close()
+                raise BulletinMissing(f"HTTP {response.status_code}")
+            if response.status_code in TRANSIENT_STATUS:
+                response.close() #return connection to the pool
+                reason = f"HTTP {response.status_code}"
+                continue
+            if response.status_code<300 or response.status_code==304:
+                return response
+            raise FetchError(f"HTTP {response.status_code}")
+        raise TransientFetchError(f"{reason} after {self.retries+1} attempts")
+
+    def get(self, url, headers=None):
+        return self.request('GET', url, headers)
+
+    def head(self, url, headers=None):
+        return self.request('HEAD', url, headers)
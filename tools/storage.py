@@ -0,0 +1,661 @@
+import pandas as pd
+import numpy as np
+
+#file manipulation
+import json
+import os
+import pathlib
+import shutil
+import uuid
+
+#import global variables
+import tools.variables as variables
+
+#optional parquet backend
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+"""
+Function definitions
+"""
+
+def fiscal_year(dates):
+    """
+    Input:
+        dates: datetime64 series
+    Output:
+        fiscal year of each date, fiscal year starts in October
+    """
+    return (dates.dt.year + (dates.dt.month>=10)).astype('int16')
+
+def typed(data):
+    """
+    Cast long-format columns to their storage types in place
+    """
+    for col in ['date', 'priority']:
+        data[col] = pd.to_datetime(data[col])
+    data['state'] = pd.Categorical(data['state'], categories=variables.STATES)
+    for col in ['EBn', 'country']:
+        data[col] = data[col].astype('category')
+    return data
+
+def to_long(data):
+    """
+    Input:
+        data: wide dataframe, EBn, state, date & one column per country (buildDatabase output)
+    Output:
+        typed long dataframe with columns EBn, state, date, country, priority
+        countries not listed in a bulletin are dropped, U cells are kept as NaT
+    """
+    countries = [col for col in data.columns if col not in variables.ID_COLUMNS]
+    data = pd.melt(data, id_vars=variables.ID_COLUMNS, value_vars=countries, var_name='country', value_name='priority')
+    data['priority'] = pd.to_datetime(data['priority'])
+    listed = data['priority'].notna().groupby([data['date'], data['country']]).transform('any')
+    data = data.loc[listed.to_numpy()].reset_index(drop=True)
+    return typed(data)
+
+def to_wide(data):
+    """
+    Inverse of to_long, rows sorted by bulletin date, state & EBn
+    """
+    wide = (data.astype({'EBn': str, 'state': str, 'country': str})
+                .drop_duplicates(subset=['date', 'state', 'EBn', 'country'])
+                .set_index(['date', 'state', 'EBn', 'country'])['priority']
+                .unstack('country')
+                .reset_index())
+    wide.columns.name = None
+
+    #sort rows the way they appear in bulletins
+    ebn_rank = {ebn:idx for idx, ebn in enumerate(variables.EBN_ORDER)}
+    state_rank = {state:idx for idx, state in enumerate(variables.STATES)}
+    wide['_state'] = wide['state'].map(state_rank)
+    wide['_ebn'] = wide['EBn'].map(ebn_rank).fillna(len(ebn_rank))
+    wide = wide.sort_values(['date', '_state', '_ebn'], kind='mergesort').drop(columns=['_state', '_ebn'])
+
+    countries = [col for col in wide.columns if col not in variables.ID_COLUMNS]
+    return wide[['EBn'] + countries + ['state', 'date']].reset_index(drop=True)
+
+def filter_long(data, countries=None, states=None, ebns=None, start=None, end=None):
+    """
+    Apply read filters to a long dataframe in memory
+    """
+    mask = np.ones(len(data.index), dtype=bool)
+    for col, values in (('country', countries), ('state', states), ('EBn', ebns)):
+        if values is not None:
+            mask &= data[col].isin(values).to_numpy()
+    if start is not None:
+        mask &= (data['date']>=pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (data['date']<=pd.Timestamp(end)).to_numpy()
+    return data.loc[mask].reset_index(drop=True)
+
+def atomic_write_csv(data, path):
+    """
+    write wide dataframe to a temporary file, then rename over path
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    data.to_csv(tmp, index=None, date_format='%Y-%m-%d')
+    os.replace(tmp, path)
+
+def atomic_write_json(obj, path):
+    """
+    write obj as json to a temporary file, then rename over path
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def bulletin_dates(data):
+    """
+    Output:
+        sorted list of distinct bulletin dates in data as YYYY-MM-DD strings
+    """
+    if len(data.index)==0:
+        return []
+    return sorted(pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').unique())
+
+def empty_long():
+    """
+    Output:
+        typed long dataframe without rows
+    """
+    return typed(pd.DataFrame(columns=['EBn', 'state', 'date', 'country', 'priority']))
+
+def write_snapshot(data, generation=0, path=variables.SNAPSHOT):
+    """
+    Input:
+        data: typed long dataframe
+        generation: manifest generation data was read at
+    pickle is written to a temporary file, then renamed over path
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    pd.to_pickle({'generation': generation, 'data': data}, tmp)
+    os.replace(tmp, path)
+
+def read_snapshot(path=variables.SNAPSHOT):
+    """
+    Output:
+        (typed long dataframe, generation), None if snapshot is missing or unreadable
+    """
+    try:
+        snapshot = pd.read_pickle(path)
+        return snapshot['data'], snapshot['generation']
+    except Exception as e:
+        if pathlib.Path(path).is_file():
+            print(f"Exception reading snapshot {e}")
+        return None
+
+def dataset_version():
+    """
+    Output:
+        cheap token (file stats only) that changes whenever one of the app's data sources changes
+    """
+    token = []
+    for path in [variables.SNAPSHOT, variables.DATASET_DIR.joinpath('_manifest.json'), variables.DATALOG]:
+        try:
+            stat = os.stat(path)
+            token.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            token.append(None)
+    return tuple(token)
+
+def load_dataset():
+    """
+    Output:
+        typed long dataframe for the app, fastest available source first:
+        1. prebuilt snapshot 2. configured store 3. legacy csv 4. empty dataframe (no data yet)
+    """
+    snapshot = read_snapshot()
+    if snapshot is not None:
+        return snapshot[0]
+    for store in [get_store(), csvStore()]:
+        if store.exists():
+            try:
+                return store.read()
+            except Exception as e:
+                print(f"Exception reading datalog {e}")
+    return empty_long()
+
+def get_store(backend=variables.STORAGE_BACKEND):
+    """
+    Output:
+        store for backend, csv if parquet was requested but pyarrow is missing
+    """
+    if backend=='parquet' and pa is not None:
+        return parquetStore()
+    return csvStore()
+
+"""
+Class definitions
+"""
+
+class manifest():
+    """
+    Json record of ingested bulletin dates, kept next to the datalog & written atomically
+    generation is bumped on every change so readers can detect new data,
+    build is a random id drawn whenever the datalog is replaced, so two stores at the same generation differ
+    Inputs:
+        path: manifest file
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+        except (FileNotFoundError, ValueError):
+            content = {}
+        self.found = bool(content)
+        self.generation = content.get('generation', 0)
+        self.build = content.get('build', '')
+        self.bulletins = set(content.get('bulletins', []))
+        self.extra = content.get('extra', {}) #backend specific bookkeeping
+
+    def exists(self):
+        return self.found
+
+    def latest_date(self):
+        """
+        Output:
+            most recent bulletin date as pandas.Timestamp, NaT if empty
+        """
+        return pd.Timestamp(max(self.bulletins)) if self.bulletins else pd.NaT
+
+    def save(self, bulletins, replace=False, generation=None, path=None, **extra):
+        """
+        Input:
+            bulletins: ingested bulletin dates as YYYY-MM-DD strings
+            replace: True->bulletins replace the recorded dates, False->added to them
+            generation: explicit generation number, default previous+1
+            path: write to another file (used when a store is rebuilt next to the old one)
+        """
+        self.bulletins = set(bulletins) if replace else self.bulletins | set(bulletins)
+        self.generation = self.generation+1 if generation is None else generation
+        if replace or not self.build:
+            self.build = uuid.uuid4().hex
+        self.extra = extra
+        self.found = True
+        atomic_write_json({
+            'generation': self.generation,
+            'build': self.build,
+            'bulletins': sorted(self.bulletins),
+            'extra': self.extra,
+        }, path or self.path)
+
+class csvStore():
+    """
+    Legacy wide csv datalog, every read parses the whole file
+    New bulletins are appended to the end of the file, the manifest records how many bytes
+    are committed so a crash during an append is rolled back on the next run
+    Inputs:
+        path: csv file
+    """
+    def __init__(self, path=variables.DATALOG):
+        self.path = pathlib.Path(path)
+        self.manifest = manifest(self.path.with_name(self.path.stem + '.manifest.json'))
+
+    def recover(self):
+        """
+        nothing to finish, an interrupted append is rolled back by check_manifest
+        """
+
+    def exists(self):
+        return self.path.is_file()
+
+    def size(self):
+        return self.path.stat().st_size if self.exists() else 0
+
+    def check_manifest(self):
+        """
+        reconcile manifest with csv file
+        1. bytes after the committed size are an interrupted append->truncate
+        2. missing manifest, interrupted rewrite or shorter file->rebuild manifest from csv
+        """
+        committed = self.manifest.extra.get('bytes')
+        size = self.size()
+        if self.manifest.exists() and committed is not None and size>committed:
+            with open(self.path, 'r+b') as f:
+                f.truncate(committed)
+        elif not self.manifest.exists() or committed is None or size<committed:
+            dates = pd.read_csv(self.path, usecols=['date']) if self.exists() else pd.DataFrame()
+            self.manifest.save(bulletin_dates(dates), replace=True, bytes=size)
+
+    def read_wide(self):
+        data = pd.read_csv(self.path)
+        for col in data.columns:
+            if col not in ['EBn', 'state']:
+                data[col] = pd.to_datetime(data[col]) #older rows mix 2016-1-1 & 2016-01-01 00:00:00
+        return data
+
+    def read(self, countries=None, states=None, ebns=None, start=None, end=None):
+        """
+        Output:
+            typed long dataframe, see to_long
+        """
+        return filter_long(to_long(self.read_wide()), countries, states, ebns, start, end)
+
+    def latest_date(self):
+        """
+        Output:
+            most recent bulletin date as pandas.Timestamp, NaT if empty
+        """
+        self.check_manifest()
+        return self.manifest.latest_date()
+
+    def read_bulletins(self, dates, batch=variables.WRITE_BATCH):
+        """
+        Input:
+            dates: bulletin dates as YYYY-MM-DD strings
+        Output:
+            generator of wide dataframes, batch bulletins at a time, the csv is parsed once
+        """
+        dates = sorted(dates)
+        if not dates:
+            return
+        data = self.read_wide()
+        bulletin = data['date'].dt.strftime('%Y-%m-%d')
+        for idx in range(0, len(dates), batch):
+            yield data.loc[bulletin.isin(dates[idx:idx+batch]).to_numpy()].reset_index(drop=True)
+
+    def writer(self, replace=False):
+        """
+        Output:
+            csvSink streaming bulletins into the datalog, replace=True->new datalog, else appended
+        """
+        return csvSink(self, replace)
+
+    def write(self, data):
+        """
+        replace datalog with wide dataframe data
+        """
+        with self.writer(replace=True) as sink:
+            sink.add(data)
+
+    def append(self, data):
+        """
+        add bulletins in wide dataframe data to the end of the datalog
+        bulletins already in the manifest are skipped
+        """
+        if not self.exists():
+            return self.write(data)
+        self.check_manifest()
+        if len(data.index)==0:
+            return
+        data = data.loc[~pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').isin(self.manifest.bulletins).to_numpy()]
+        if len(data.index)==0:
+            return
+
+        header = list(pd.read_csv(self.path, nrows=0).columns)
+        if set(data.columns) - set(header): #new country column, layout changes once
+            return self.write(pd.concat([self.read_wide(), data]))
+
+        with open(self.path, 'rb') as f: #make sure last row is terminated
+            f.seek(max(self.size()-1, 0))
+            newline = f.read(1) in [b'\n', b'']
+        with open(self.path, 'a') as f:
+            if not newline:
+                f.write('\n')
+            data.reindex(columns=header).to_csv(f, header=False, index=None, date_format='%Y-%m-%d')
+            f.flush()
+            os.fsync(f.fileno())
+        self.manifest.save(bulletin_dates(data), bytes=self.size())
+
+    def to_csv(self, path):
+        atomic_write_csv(self.read_wide(), path)
+
+class parquetStore():
+    """
+    Typed long-format parquet dataset, hive-partitioned by bulletin fiscal year
+    One file per bulletin (fiscal_year=<fy>/bulletin-<date>.parquet), written to a temporary
+    name & renamed, so appending a bulletin never rewrites existing files & is idempotent
+    Filters on country, state & EBn are pushed down to the parquet reader,
+    date ranges only open the fiscal year partitions they overlap
+    Inputs:
+        path: dataset directory
+    """
+    def __init__(self, path=variables.DATASET_DIR):
+        if pa is None:
+            raise ImportError("parquetStore requires pyarrow")
+        self.path = pathlib.Path(path)
+        self.manifest = manifest(self.path.joinpath('_manifest.json')) #'_' prefix is ignored by dataset discovery
+
+    def recover(self):
+        """
+        finish a rewrite interrupted between moving the old dataset aside & moving the new one in (see parquetSink.commit)
+        the new dataset is complete once its manifest is written, else the old one is restored
+        only called by writers, a reader renaming directories could race a commit in progress
+        """
+        if self.path.exists():
+            return
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        old = self.path.with_name(self.path.name + '.old')
+        if tmp.joinpath('_manifest.json').is_file():
+            os.replace(tmp, self.path)
+            shutil.rmtree(old, ignore_errors=True)
+        elif old.is_dir():
+            os.replace(old, self.path)
+        else:
+            return
+        self.manifest.load()
+
+    def exists(self):
+        return self.path.is_dir() and any(self.path.glob('fiscal_year=*/*.parquet'))
+
+    def check_manifest(self):
+        """
+        rebuild missing manifest from the bulletin dates in the dataset
+        """
+        if not self.manifest.exists() and self.exists():
+            dates = self.dataset().to_table(columns=['date']).to_pandas()
+            self.manifest.save(bulletin_dates(dates), replace=True)
+
+    def dataset(self):
+        return ds.dataset(str(self.path), format='parquet', partitioning='hive')
+
+    def read(self, countries=None, states=None, ebns=None, start=None, end=None):
+        """
+        Output:
+            typed long dataframe, see to_long
+        """
+        expr = None
+        def combine(e):
+            return e if expr is None else expr & e
+        for col, values in (('country', countries), ('state', states), ('EBn', ebns)):
+            if values is not None:
+                expr = combine(ds.field(col).isin(list(values)))
+        if start is not None:
+            expr = combine(ds.field('fiscal_year')>=int(fiscal_year(pd.Series([pd.Timestamp(start)]))[0]))
+        if end is not None:
+            expr = combine(ds.field('fiscal_year')<=int(fiscal_year(pd.Series([pd.Timestamp(end)]))[0]))
+
+        table = self.dataset().to_table(filter=expr, columns=['EBn', 'state', 'date', 'country', 'priority'])
+        data = typed(table.to_pandas())
+        data = data.sort_values(['date'], kind='mergesort').reset_index(drop=True) #fragments come back in arbitrary order
+        return filter_long(data, start=start, end=end)
+
+    def latest_date(self):
+        """
+        Output:
+            most recent bulletin date as pandas.Timestamp, NaT if empty
+        """
+        self.check_manifest()
+        return self.manifest.latest_date()
+
+    def read_bulletins(self, dates, batch=variables.WRITE_BATCH):
+        """
+        Input:
+            dates: bulletin dates as YYYY-MM-DD strings
+        Output:
+            generator of wide dataframes, batch bulletins at a time, each read only opens the partitions it spans
+        """
+        dates = sorted(dates)
+        for idx in range(0, len(dates), batch):
+            chunk = dates[idx:idx+batch]
+            data = self.read(start=chunk[0], end=chunk[-1])
+            yield to_wide(data.loc[data['date'].dt.strftime('%Y-%m-%d').isin(chunk).to_numpy()])
+
+    def write_partitions(self, data, path):
+        """
+        write wide dataframe data under path, one parquet file per bulletin
+        """
+        if len(data.index)==0:
+            return
+        data = to_long(data)
+        data = data.astype({'EBn': str, 'state': str, 'country': str}) #plain strings, parquet dictionary-encodes on disk
+        for date, bulletin in data.groupby('date', sort=True):
+            date = pd.Timestamp(date)
+            partition = pathlib.Path(path).joinpath('fiscal_year={}'.format(date.year + (date.month>=10)))
+            partition.mkdir(parents=True, exist_ok=True)
+            name = 'bulletin-{}.parquet'.format(date.strftime('%Y-%m-%d'))
+            tmp = partition.joinpath('.' + name + '.tmp') #'.' prefix is ignored by dataset discovery
+            pq.write_table(pa.Table.from_pandas(bulletin, preserve_index=False), str(tmp))
+            os.replace(tmp, partition.joinpath(name))
+
+    def writer(self, replace=False):
+        """
+        Output:
+            parquetSink streaming bulletins into the dataset, replace=True->new dataset, else appended
+        """
+        self.recover()
+        return parquetSink(self, replace)
+
+    def write(self, data):
+        """
+        replace dataset with wide dataframe data
+        new dataset is written next to the old one and swapped in at the end
+        """
+        with self.writer(replace=True) as sink:
+            sink.add(data)
+
+    def append(self, data):
+        """
+        add bulletins in wide dataframe data, only writes their own files
+        bulletins already in the manifest are skipped
+        """
+        with self.writer() as sink:
+            sink.add(data)
+
+    def to_csv(self, path):
+        """
+        export dataset in the legacy wide csv layout
+        """
+        atomic_write_csv(to_wide(self.read()), path)
+
+class bulletinSink():
+    """
+    Streams normalized bulletins into a store one at a time, so a build never holds the whole history
+    add() writes a wide dataframe of one or more bulletins, commit() makes a replacement visible,
+    abort() drops it. As a context manager, commits on success & aborts on exceptions
+    Inputs:
+        store: csvStore or parquetStore
+        replace: True->bulletins form a new datalog that replaces the old one on commit,
+            False->bulletins are appended, ones already in the manifest are skipped
+    Attributes:
+        bulletins: dates (YYYY-MM-DD) of the bulletins written
+    """
+    def __init__(self, store, replace):
+        self.store = store
+        self.replace = replace
+        self.bulletins = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return
+        try:
+            self.commit()
+        except BaseException:
+            self.abort()
+            raise
+
+    def new_bulletins(self, data):
+        """
+        rows of bulletins that aren't in the store or this sink yet
+        """
+        done = set(self.bulletins) if self.replace else self.store.manifest.bulletins | set(self.bulletins)
+        return data.loc[~pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').isin(done).to_numpy()]
+
+    def commit(self):
+        pass
+
+    def abort(self):
+        pass
+
+class csvSink(bulletinSink):
+    """
+    Replacement is written to <datalog>.tmp & renamed over the datalog on commit,
+    appends go through csvStore.append (committed per bulletin)
+    """
+    def __init__(self, store, replace):
+        super().__init__(store, replace)
+        self.tmp = store.path.with_name(store.path.name + '.tmp')
+        self.header = None
+        if not replace and store.exists():
+            store.check_manifest()
+
+    def add(self, data):
+        data = self.new_bulletins(data)
+        if len(data.index)==0:
+            return
+        if not self.replace:
+            self.store.append(data)
+        elif self.header is None:
+            self.tmp.parent.mkdir(parents=True, exist_ok=True)
+            data.to_csv(self.tmp, index=None, date_format='%Y-%m-%d')
+            self.header = list(data.columns)
+        else:
+            if set(data.columns) - set(self.header): #new country column, layout changes once
+                self.relayout(self.header + [col for col in data.columns if col not in self.header])
+            with open(self.tmp, 'a') as f:
+                data.reindex(columns=self.header).to_csv(f, header=False, index=None, date_format='%Y-%m-%d')
+        self.bulletins += bulletin_dates(data)
+
+    def relayout(self, header):
+        """
+        copy the rows written so far under the wider header, a few thousand rows at a time
+        cells are copied as the text already written, so every date keeps the YYYY-MM-DD format
+        """
+        relayout = self.tmp.with_name(self.tmp.name + '.relayout')
+        with open(relayout, 'w') as f:
+            pd.DataFrame(columns=header).to_csv(f, index=None)
+            for rows in pd.read_csv(self.tmp, dtype=str, keep_default_na=False, chunksize=4096):
+                rows.reindex(columns=header, fill_value='').to_csv(f, header=False, index=None)
+        os.replace(relayout, self.tmp)
+        self.header = header
+
+    def commit(self):
+        if not self.replace:
+            return
+        if self.header is None: #no bulletins, empty datalog
+            self.tmp.parent.mkdir(parents=True, exist_ok=True)
+            pd.DataFrame().to_csv(self.tmp, index=None)
+        with open(self.tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        self.store.manifest.save([], replace=True, bytes=None) #rewrite in progress
+        os.replace(self.tmp, self.store.path)
+        self.store.manifest.save(self.bulletins, replace=True, bytes=self.store.size())
+
+    def abort(self):
+        if self.replace:
+            for path in [self.tmp, self.tmp.with_name(self.tmp.name + '.relayout')]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+class parquetSink(bulletinSink):
+    """
+    Replacement is written to a <dataset>.tmp directory & swapped in on commit,
+    appended bulletin files go straight into the dataset & are recorded in the manifest on commit
+    """
+    def __init__(self, store, replace):
+        super().__init__(store, replace)
+        if replace:
+            self.path = store.path.with_name(store.path.name + '.tmp')
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True)
+        else:
+            store.check_manifest()
+            self.path = store.path
+
+    def add(self, data):
+        data = self.new_bulletins(data)
+        if len(data.index)==0:
+            return
+        self.store.write_partitions(data, self.path)
+        self.bulletins += bulletin_dates(data)
+
+    def commit(self):
+        if not self.replace:
+            if self.bulletins:
+                self.store.manifest.save(self.bulletins) #commit after files are in place
+            return
+        self.store.manifest.save(self.bulletins, replace=True, path=self.path.joinpath(self.store.manifest.path.name))
+        old = self.store.path.with_name(self.store.path.name + '.old')
+        if self.store.path.exists():
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(self.store.path, old)
+        os.replace(self.path, self.store.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def abort(self):
+        if self.replace:
+            shutil.rmtree(self.path, ignore_errors=True)
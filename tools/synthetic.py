@@ -0,0 +1,403 @@
+"""
+Synthetic visa bulletins & a local stand-in for travel.state.gov, used for scale testing ingestion
+Usage:
+    python -m tools.synthetic [--port 8000] [--latency 0.05] [--error-rate 0.02] [--seed 0]
+    then buildDatabase(base_url='http://127.0.0.1:8000', ...)
+"""
+import argparse
+import hashlib
+import math
+import random
+import textwrap
+import threading
+import time
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import regex as re
+
+#import global variables
+import tools.variables as variables
+
+#url layout of urlGen.build_path
+PATH_PATTERN = re.compile(r'^/content/travel/en/legal/visa-law0/visa-bulletin/(\d{4})/visa-bulletin-for-([a-z]+)-(\d{4})\.html$')
+
+#raw employment table headers & the bulletins they are listed in, (first, last), None->open ended
+COUNTRY_HEADERS = [
+    ('All Chargeability <br>Areas Except <br>Those Listed', None, None),
+    ('CHINA-<br>mainland <br>born', None, None),
+    ('EL SALVADOR<br>GUATEMALA<br>HONDURAS', datetime(2016, 5, 1), None),
+    ('INDIA', None, None),
+    ('MEXICO', None, None),
+    ('PHILIPPINES', None, None),
+    ('VIETNAM', datetime(2018, 5, 1), datetime(2021, 9, 1)),
+]
+EBN_ROWS = ['1st', '2nd', '3rd', 'Other Workers', '4th', 'Certain Religious Workers',
+            '5th Non-Regional<br>Center<br>(C5 and T5)', '5th Regional<br>Center<br>(I5 and R5)']
+
+#pdf bulletin layout, points
+PDF_FONT_SIZE = 6
+PDF_LINE_HEIGHT = 7
+PDF_COLUMN_WIDTH = 72
+PDF_MARGIN = 36
+PDF_WRAP = 20 #characters per line of a table cell
+
+"""
+Function definitions
+"""
+
+def pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def pdf_document(pages, width=612, height=792):
+    """
+    Input:
+        pages: content stream of each page, drawn with the Helvetica font as /F1
+        width, height: page size in points
+    Output:
+        minimal pdf file as bytes
+    """
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [{}] /Count {} >>'.format(' '.join('{} 0 R'.format(4+2*i) for i in range(len(pages))), len(pages)).encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    for i, content in enumerate(pages):
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {} {}] /Resources << /Font << /F1 3 0 R >> >> /Contents {} 0 R >>'
+                        .format(width, height, 5+2*i).encode())
+        stream = content.encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + obj + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects)+1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects)+1, xref)
+    return bytes(out)
+
+"""
+Class definitions
+"""
+
+class pdfLayout():
+    """
+    Lays out text & ruled tables top to bottom, starting a new page when a row doesn't fit
+    A table split by a page break continues on the next page without its header row, like printed bulletins
+    Inputs:
+        width, height: page size in points
+    """
+    def __init__(self, width=612, height=792):
+        self.width = width
+        self.height = height
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = self.height - PDF_MARGIN
+
+    def text(self, x, y, line):
+        self.ops.append('BT /F1 {} Tf 1 0 0 1 {} {} Tm ({}) Tj ET'.format(PDF_FONT_SIZE, x, y, pdf_escape(line)))
+
+    def heading(self, line):
+        if self.y - 2*PDF_LINE_HEIGHT < PDF_MARGIN:
+            self.new_page()
+        self.y -= PDF_LINE_HEIGHT
+        self.text(PDF_MARGIN, self.y, line)
+        self.y -= PDF_LINE_HEIGHT
+
+    def table(self, header, rows):
+        """
+        header & rows: cell strings, <br> breaks a line & long lines are wrapped to the column
+        """
+        for row in [header] + rows:
+            lines = [sum([textwrap.wrap(line, PDF_WRAP) or [''] for line in cell.split('<br>')], []) for cell in row]
+            row_height = max(len(cell) for cell in lines)*PDF_LINE_HEIGHT + 4
+            if self.y - row_height < PDF_MARGIN:
+                self.new_page()
+            top, bottom = self.y, self.y - row_height
+            for idx, cell in enumerate(lines):
+                x = PDF_MARGIN + idx*PDF_COLUMN_WIDTH
+                self.ops.append('{} {} {} {} re S'.format(x, bottom, PDF_COLUMN_WIDTH, row_height)) #ruled cell
+                for n, line in enumerate(cell):
+                    self.text(x + 2, top - (n+1)*PDF_LINE_HEIGHT, line.strip())
+            self.y = bottom
+        self.y -= PDF_LINE_HEIGHT
+
+    def to_pdf(self):
+        return pdf_document(['\n'.join(ops) for ops in self.pages], self.width, self.height)
+
+class bulletinGenerator():
+    """
+    Deterministic synthetic bulletin pages with the markup of real post-2010 bulletins:
+    family, 2 employment (final & filing) & diversity tables, C/U cells & DDMMMYY dates
+    Each (state, EBn, country) series lags the bulletin date by a base lag plus a slow
+    oscillation & monthly noise, so dates advance, stall & retrogress
+    Inputs:
+        seed: same seed->same pages
+        u_rate: fraction of cells reported as U
+    """
+    def __init__(self, seed=0, u_rate=0.02):
+        self.seed = seed
+        self.u_rate = u_rate
+
+    def rng(self, *key):
+        return random.Random('-'.join(str(k) for k in (self.seed,) + key))
+
+    def cell(self, state, ebn, country, bulletin):
+        """
+        Output:
+            raw table cell for one series in the bulletin dated bulletin
+        """
+        months = bulletin.year*12 + bulletin.month
+        series = self.rng(state, ebn, country)
+        base = series.choice([0, 0, 200, 700, 1500, 3000, 4500]) #days behind bulletin date
+        amplitude, period = series.uniform(0, 400), series.uniform(24, 96)
+        noise = self.rng(state, ebn, country, bulletin.year, bulletin.month)
+        if noise.random()<self.u_rate:
+            return 'U'
+
+        lag = base + amplitude*math.sin(2*math.pi*months/period) + noise.gauss(0, 30)
+        if state=='filing':
+            lag -= 120 #filing dates run ahead of final action dates
+        if lag<30:
+            return 'C'
+        cutoff = datetime.fromordinal(bulletin.toordinal() - int(lag))
+        return cutoff.strftime('%d%b%y').upper()
+
+    def table(self, header, rows):
+        out = ['<table border="1" cellpadding="0" cellspacing="0">', '<tbody>']
+        out.append('<tr>' + ''.join('<td><strong>{}</strong></td>'.format(h) for h in header) + '</tr>')
+        for row in rows:
+            out.append('<tr>' + ''.join('<td>{}</td>'.format(c) for c in row) + '</tr>')
+        out += ['</tbody>', '</table>']
+        return '\n'.join(out)
+
+    def employment_rows(self, state, bulletin):
+        """
+        Output:
+            (header, rows) of an employment table
+        """
+        countries = [h for h, first, last in COUNTRY_HEADERS
+                        if (first is None or bulletin>=first) and (last is None or bulletin<=last)]
+        rows = [[ebn] + [self.cell(state, ebn, country, bulletin) for country in countries] for ebn in EBN_ROWS]
+        return ['Employment-<br>based'] + countries, rows
+
+    def employment_table(self, state, bulletin):
+        return self.table(*self.employment_rows(state, bulletin))
+
+    def family_rows(self, bulletin):
+        header = ['Family-<br>Sponsored', 'All Chargeability Areas Except Those Listed', 'CHINA-mainland born', 'INDIA', 'MEXICO', 'PHILIPPINES']
+        rows = [[f] + [self.cell('family', f, country, bulletin) for country in header[1:]] for f in ['F1', 'F2A', 'F2B', 'F3', 'F4']]
+        return header, rows
+
+    def family_table(self, bulletin):
+        return self.table(*self.family_rows(bulletin))
+
+    def generate(self, month, year):
+        """
+        Input:
+            month & year as ints
+        Output:
+            bulletin page html
+        """
+        bulletin = datetime(year, month, 1)
+        title = 'Visa Bulletin For {} {}'.format(variables.MONTH_DICT[month].capitalize(), year)
+        return '\n'.join([
+            '<!DOCTYPE html>',
+            '<html lang="en">',
+            '<head><meta charset="utf-8"><title>{}</title></head>'.format(title),
+            '<body>',
+            '<div class="tsg-rwd-main-copy-body-frame">',
+            '<h1>{}</h1>'.format(title),
+            '<h3>A.  FINAL ACTION DATES FOR FAMILY-SPONSORED PREFERENCE CASES</h3>',
+            self.family_table(bulletin),
+            '<h3>A.  FINAL ACTION DATES FOR EMPLOYMENT-BASED PREFERENCE CASES</h3>',
+            self.employment_table('final', bulletin),
+            '<h3>B.  DATES FOR FILING OF EMPLOYMENT-BASED VISA APPLICATIONS</h3>',
+            self.employment_table('filing', bulletin),
+            '<h2>C.  THE DIVERSITY (DV) IMMIGRANT CATEGORY</h2>',
+            self.table(['Region', 'All DV Chargeability Areas Except Those Listed Separately'],
+                        [['AFRICA', '15,000'], ['ASIA', '7,500'], ['EUROPE', '9,000']]),
+            '</div>',
+            '</body>',
+            '</html>',
+        ])
+
+    def generate_pdf(self, month, year, height=792):
+        """
+        Input:
+            month & year as ints
+            height: page height in points, short pages split tables across page breaks
+        Output:
+            printed bulletin as pdf bytes, family & employment tables as ruled grids
+            dates for filing were published from October 2015 on, earlier bulletins only list final action dates
+        """
+        bulletin = datetime(year, month, 1)
+        layout = pdfLayout(height=height)
+        layout.heading('Visa Bulletin For {} {}'.format(variables.MONTH_DICT[month].capitalize(), year))
+        layout.heading('A.  FINAL ACTION DATES FOR FAMILY-SPONSORED PREFERENCE CASES')
+        layout.table(*self.family_rows(bulletin))
+        layout.heading('A.  FINAL ACTION DATES FOR EMPLOYMENT-BASED PREFERENCE CASES')
+        layout.table(*self.employment_rows('final', bulletin))
+        if bulletin>=datetime(2015, 10, 1):
+            layout.heading('B.  DATES FOR FILING OF EMPLOYMENT-BASED VISA APPLICATIONS')
+            layout.table(*self.employment_rows('filing', bulletin))
+        return layout.to_pdf()
+
+class standInHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128 #default of 5 drops concurrent connects, clients then wait ~1s to retry
+    daemon_threads = True
+
+class standInServer():
+    """
+    Local threaded http server answering urls in the urlGen.build_path layout with synthetic bulletins
+    Supports GET & HEAD, ETag/If-None-Match & Last-Modified, injected latency & 503 errors
+    Inputs:
+        generator: bulletinGenerator
+        latency: seconds added to every response
+        error_rate: fraction of requests answered with 503
+        last_bulletin: latest published bulletin, later months answer 404, None->current month
+        host, port: port 0 picks a free port
+    """
+    def __init__(self, generator=None, latency=0.0, error_rate=0.0, last_bulletin=None, host='127.0.0.1', port=0, seed=0):
+        self.generator = generator if generator is not None else bulletinGenerator()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.last_bulletin = last_bulletin
+        self.errors = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'bytes': 0, 'errors': 0, 'missing': 0, 'not_modified': 0}
+        self.httpd = standInHTTPServer((host, port), standInHandler)
+        self.httpd.standin = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.counts[key] += value
+
+    def page(self, path):
+        """
+        Output:
+            html for a bulletin path, None if it doesn't exist
+        """
+        match = PATH_PATTERN.match(path)
+        if not match:
+            return None
+        fiscal_year, month, year = int(match.group(1)), match.group(2), int(match.group(3))
+        if month not in variables.MONTH_DICT_REV:
+            return None
+        month = variables.MONTH_DICT_REV[month]
+        if fiscal_year!=(year+1 if month>=10 else year):
+            return None
+        last = self.last_bulletin or datetime.now()
+        if (year, month)>(last.year, last.month):
+            return None
+        return self.generator.generate(month, year)
+
+    def start(self):
+        """
+        serve in a background thread
+        Output:
+            base url, e.g. http://127.0.0.1:53211
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='stand-in-server', daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class standInHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for standInServer, the server object is self.server.standin
+    """
+    protocol_version = 'HTTP/1.1' #keep-alive
+
+    def respond(self, body):
+        standin = self.server.standin
+        standin.count('requests')
+        if standin.latency:
+            time.sleep(standin.latency)
+        with standin.lock:
+            error = standin.errors.random()<standin.error_rate
+        if error:
+            standin.count('errors')
+            return self.send_status(503)
+
+        html = standin.page(self.path.split('?')[0])
+        if html is None:
+            standin.count('missing')
+            return self.send_status(404)
+
+        content = html.encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest()[:16])
+        if self.headers.get('If-None-Match')==etag:
+            standin.count('not_modified')
+            return self.send_status(304, {'ETag': etag})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(0, usegmt=True)) #published bulletins never change
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+            standin.count('bytes', len(content))
+
+    def send_status(self, code, headers=None):
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def log_message(self, format, *args):
+        pass #silent, thousands of requests per run
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic visa bulletins in the travel.state.gov url layout")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = standInServer(bulletinGenerator(seed=args.seed), latency=args.latency, error_rate=args.error_rate,
+                            host=args.host, port=args.port, seed=args.seed)
+    print(f"serving synthetic bulletins on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -10,4 +10,55 @@ DATALOG = PROJECT_DIR.joinpath('data', 'datalog.csv')
 
 #default start date
 from datetime import datetime
-START_DATE = datetime(year=2016, month=1, day=1)
\ No newline at end of file
+START_DATE = datetime(year=2016, month=1, day=1)
+
+#bulletin host, scheme & netloc used by urlGen
+BULLETIN_BASE_URL = 'https://travel.state.gov'
+
+#concurrent fetching
+FETCH_WORKERS = 8 #max number of bulletins downloaded at the same time
+RATE_LIMIT = 4 #max requests per second sent to a single host
+PARSE_WORKERS = 1 #processes used to parse downloaded pages
+PDF_WORKERS = None #processes parsing pdf bulletins, None->one per cpu
+WRITE_BATCH = 24 #bulletins normalized & written to the store together, bounds memory of a build
+
+#a table is employment-based if its header row matches one string from EACH group
+EMPLOYMENT_FINGERPRINTS = (('Employment',), ('Chargeability', 'All', 'Except'))
+
+#table cell normalization
+CELL_DATE_FORMAT = '%d%b%y' #e.g. 01FEB20
+EBN_CATEGORIES = { #{standard label: regex matched against raw EBn cell}, first match wins
+    '5th regional': 'I5|R5',
+    '5th non-regional': 'C5|T5',
+    'Religious Workers': 'Certain|Religious',
+}
+
+#raw html cache
+CACHE_DIR = PROJECT_DIR.joinpath('data', 'cache')
+CACHE_MAX_BYTES = 256*1024*1024 #evict least recently used pages above this size
+FETCH_TIMEOUT = 30 #seconds to wait for a response
+CONNECT_TIMEOUT = 5 #seconds to wait for a connection
+MISSING_TTL = 6*3600 #seconds a bulletin that answered 404 isn't requested again
+PROBE_MONTHS = 2 #bulletins this recent may be unpublished, checked with HEAD before downloading
+
+#http session
+HTTP_RETRIES = 4 #retries of transient failures (connection errors, timeouts, 429 & 5xx)
+HTTP_BACKOFF = 0.5 #seconds, retry n waits a random time up to HTTP_BACKOFF*2**n
+HTTP_MAX_BACKOFF = 30 #seconds
+HTTP_POOL_SIZE = 16 #pooled connections per host, at least FETCH_WORKERS
+
+#storage
+STORAGE_BACKEND = 'parquet' #'parquet' or 'csv', parquet needs pyarrow
+DATASET_DIR = PROJECT_DIR.joinpath('data', 'datalog') #parquet dataset, one partition per bulletin fiscal year
+ID_COLUMNS = ['EBn', 'state', 'date'] #every other datalog column holds one country
+STATES = ['final', 'filing']
+SNAPSHOT = PROJECT_DIR.joinpath('data', 'snapshot.pkl') #typed long-format copy of the datalog loaded by the app
+CUBE_DIR = PROJECT_DIR.joinpath('data', 'cube') #memory-mapped cube generations shared by the app's workers, see tools.cube
+DERIVED = PROJECT_DIR.joinpath('data', 'derived.pkl') #per-series movement, retrogression & gap, see tools.derived
+EBN_ORDER = ['1st', '2nd', '3rd', 'Other Workers', '4th', 'Religious Workers', '5th non-regional', '5th regional']
+
+#run report written by buildDatabase
+RUN_REPORT = PROJECT_DIR.joinpath('data', 'run_report.json')
+
+#checkpoints of resumable builds
+CHECKPOINT_DIR = PROJECT_DIR.joinpath('data', 'checkpoint')
@@ -0,0 +1,109 @@
+"""
+Batch evaluation of watched priority dates against the datalog
+Usage:
+    python -m tools.watches watches.csv [-o results.csv]
+watches.csv needs priority_date, country & EBn columns, any other column is passed through
+"""
+import argparse
+import sys
+
+import pandas as pd
+import numpy as np
+
+#import global variables
+import tools.variables as variables
+import tools.storage as storage
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+SPAN = 2**22 #days reserved per series in the flattened search array, dates must be within +-2**21 days of 1970
+UNAVAILABLE = -2**21 + 1 #U & unlisted cutoffs, before any priority date
+
+"""
+Function definitions
+"""
+
+def to_days(dates):
+    """
+    Output:
+        int64 days since epoch, NaT->UNAVAILABLE
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[D]')
+    days = (dates - EPOCH).astype('int64')
+    return np.where(np.isnat(dates), UNAVAILABLE, days)
+
+"""
+Class definitions
+"""
+
+class watchIndex():
+    """
+    Sorted arrays over every (country, EBn, state) series of a dataset for batch watch lookups
+    Per series the running maximum (cummax) of the cutoff is non-decreasing, so the first bulletin
+    a priority date was current in is a searchsorted over it. Series are offset by SPAN days &
+    flattened into one sorted array, so all watches are answered by one searchsorted call
+    Inputs:
+        data: typed long dataframe
+    """
+    def __init__(self, data):
+        data = (data.astype({'EBn': str, 'state': str, 'country': str})
+                    .drop_duplicates(subset=['country', 'EBn', 'state', 'date'])
+                    .sort_values(['country', 'EBn', 'state', 'date'], kind='mergesort'))
+        self.series = pd.MultiIndex.from_frame(data[['country', 'EBn', 'state']].drop_duplicates())
+        series_id = self.series.get_indexer(pd.MultiIndex.from_frame(data[['country', 'EBn', 'state']]))
+
+        cutoffs = pd.Series(to_days(data['priority']))
+        running = cutoffs.groupby(series_id).cummax().to_numpy()
+        self.flat = series_id.astype('int64')*SPAN + running #sorted: by series, then non-decreasing cutoff
+        self.dates = data['date'].to_numpy()
+
+        #per series, one past its last row & its latest cutoff, last slot stands for unknown series
+        self.end = np.append(np.searchsorted(series_id, np.arange(len(self.series)), side='right'), 0)
+        self.last_cutoff = np.append(cutoffs.to_numpy()[self.end[:-1]-1], UNAVAILABLE)
+        self.latest = data['date'].max() if len(data.index) else pd.NaT
+
+    def evaluate(self, watches, states=variables.STATES):
+        """
+        Input:
+            watches: dataframe with priority_date, country & EBn columns
+            states: bulletin tables to evaluate
+        Output:
+            copy of watches with, per state,
+            current_<state>: priority date is current in the latest bulletin listing the series
+            first_current_<state>: first bulletin the priority date was current in, NaT if never
+        Watches without a priority date or for series that aren't in the dataset are never current
+        """
+        result = watches.copy()
+        priority = to_days(watches['priority_date'])
+        for state in states:
+            keys = pd.MultiIndex.from_arrays([watches['country'].astype(str).to_numpy(), watches['EBn'].astype(str).to_numpy(),
+                                                np.full(len(watches.index), state, dtype=object)])
+            series_id = self.series.get_indexer(keys)
+            series_id = np.where((series_id>=0) & (priority>UNAVAILABLE), series_id, len(self.series))
+
+            pos = np.searchsorted(self.flat, series_id.astype('int64')*SPAN + priority, side='left')
+            found = pos<self.end[series_id]
+            first = np.full(len(watches.index), np.datetime64('NaT'), dtype='datetime64[ns]')
+            first[found] = self.dates[pos[found]]
+
+            result['current_{}'.format(state)] = found & (priority<=self.last_cutoff[series_id])
+            result['first_current_{}'.format(state)] = first
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Check which watched priority dates are current")
+    parser.add_argument('watches', help="csv with priority_date, country & EBn columns")
+    parser.add_argument('-o', '--output', help="write results csv here, default stdout")
+    args = parser.parse_args()
+
+    watches = pd.read_csv(args.watches)
+    missing = {'priority_date', 'country', 'EBn'} - set(watches.columns)
+    if missing:
+        parser.error("watches csv is missing column(s): {}".format(', '.join(sorted(missing))))
+
+    index = watchIndex(storage.load_dataset())
+    result = index.evaluate(watches)
+    print("evaluated {} watches against bulletins up to {}".format(len(result.index), index.latest), file=sys.stderr)
+    result.to_csv(args.output or sys.stdout, index=False, date_format='%Y-%m-%d')
+
+if __name__ == '__main__':
+    main()